@@ -1,39 +1,15 @@
 # backend.py
+import concurrent.futures
 import os
 import json
 from datetime import datetime
 from typing import Dict, Tuple
-from pathlib import Path
-
-firebase_config_path = Path('firebase_config.json')
-gemini_api_key_path = Path('gemini_api_key.txt')
-ocp_api_key_path = Path('ocp_api_key.txt')
-gemini_api_key_txt = os.environ.get('GEMINI_API_KEY_TXT')
-ocp_api_key_txt = os.environ.get('OCP_API_KEY_TXT')
-
-if gemini_api_key_txt:
-    os.environ['GEMINI_API_KEY_TXT'] = gemini_api_key_txt
-    print("gemini_api_key loaded from huggingface")
-elif gemini_api_key_path.exists():
-    with open('gemini_api_key.txt', 'r') as f:
-        api_key = f.read().strip().split('\n')[0].strip()
-        os.environ['GEMINI_API_KEY_TXT'] = api_key
-    print("gemini_api_key.txt found")
-elif 'GEMINI_API_KEY_TXT' not in os.environ:
-    print("GEMINI_API_KEY not found")
-
-if ocp_api_key_txt:
-    os.environ['OCP_API_KEY_TXT'] = ocp_api_key_txt
-    print("ocp_api_key_txt loaded from huggingface")
-elif ocp_api_key_path.exists():
-    with open('ocp_api_key.txt', 'r') as f:
-        api_key = f.read().strip().split('\n')[0].strip()
-        os.environ['OCP_API_KEY_TXT'] = api_key
-    print("ocp_api_key_txt found")
-elif 'OCP_API_KEY_TXT' not in os.environ:
-    print("OCP_API_KEY not found")
-
-from utils.gemini_api import identify_and_analyze_fish
+
+# APIキーはimport時ではなく、最初に使うとき（またはウォームアップ時）に utils.api_keys.load_api_keys で読み込む
+from utils.aio import run_sync
+from utils.gemini_api import identify_and_analyze_fish_async, start_species_identification
+from utils.image_pool import preprocess_image_in_pool  # アップロード画像の前処理（frontendから呼ぶ。別プロセスで実行）
+from utils.result_cache import get_result_cache
 
 def validate_input(image_bytes: bytes, prefecture: str) -> Tuple[bool, str]:
     if not image_bytes or len(image_bytes) == 0:
@@ -55,7 +31,30 @@ def clean_prefecture_name(prefecture: str) -> str:
     return prefecture
 
 
-def identify_and_check_fish(image_bytes: bytes, prefecture: str, city: str = None, latitude: float = None, longitude: float = None) -> Dict:
+def get_cache_stats() -> Dict:
+    # 魚種識別結果キャッシュのヒット・ミス数
+    return get_result_cache().stats()
+
+
+def start_speculative_identification(image_bytes: bytes) -> concurrent.futures.Future:
+    # 画像が選ばれた時点で魚種識別だけを先に始める（結果はidentify_and_check_fishのspecies_jobに渡す）
+    return start_species_identification(image_bytes)
+
+
+def cancel_speculative_identification(species_job: concurrent.futures.Future) -> None:
+    # 別の画像が選ばれたなど、使わなくなった投機実行を止める
+    if species_job is not None and not species_job.done():
+        species_job.cancel()
+
+
+def identify_and_check_fish(image_bytes: bytes, prefecture: str, city: str = None, latitude: float = None, longitude: float = None,
+                            species_job: concurrent.futures.Future = None) -> Dict:
+    # 同期版は共有イベントループで非同期版を実行して結果を待つだけ
+    return run_sync(identify_and_check_fish_async(image_bytes, prefecture, city, latitude, longitude, species_job))
+
+
+async def identify_and_check_fish_async(image_bytes: bytes, prefecture: str, city: str = None, latitude: float = None, longitude: float = None,
+                                        species_job: concurrent.futures.Future = None) -> Dict:
     try:
         is_valid, error_msg = validate_input(image_bytes, prefecture)
         if not is_valid:
@@ -76,14 +75,16 @@ def identify_and_check_fish(image_bytes: bytes, prefecture: str, city: str = Non
             print(f"座標: ({latitude}, {longitude})")
         print(f"{'=' * 60}\n")
 
+        # 同じ画像の魚種識別はキャッシュから返し（gemini_api）、漁業権と持ち帰りの判定は毎回行う
         print("Gemini APIで魚を識別・分析中...")
 
-        result = identify_and_analyze_fish(
+        result = await identify_and_analyze_fish_async(
             image_bytes=image_bytes,
             prefecture=prefecture,
             city=city,
             latitude=latitude,
-            longitude=longitude
+            longitude=longitude,
+            species_job=species_job
         )
 
         if not result.get('success'):
@@ -95,14 +96,14 @@ def identify_and_check_fish(image_bytes: bytes, prefecture: str, city: str = Non
         is_poisonous = result.get('isPoisonous', False)
         print(f"識別結果: {fish_name_ja} ({fish_name_en})")
         print(f"学名: {scientific_name}")
-        print(f"持ち帰り: {'OK' if result.get('isLegal') else 'NG'}")
+        print(f"持ち帰り: {'確認できません' if result.get('isLegal') is None else 'OK' if result.get('isLegal') else 'NG'}")
 
 
         print(f"完了\n{'=' * 60}\n")
 
-        return {
+        response = {
             "success": True,
-            "fromCache": False,
+            "fromCache": result.get('fromCache', False),
             "isLegal": result.get('isLegal'),
             "fishNameJa": fish_name_ja,
             "fishNameEn": fish_name_en,
@@ -110,8 +111,13 @@ def identify_and_check_fish(image_bytes: bytes, prefecture: str, city: str = Non
             "gyogyoken": result.get('gyogyoken'),
             "isEdible": result.get('isEdible'),
             "isPoisonous": is_poisonous,
+            "message": result.get('message'),
+            "fisheryRightsStale": result.get('fisheryRightsStale', False),
+            "fisheryRightsAvailable": result.get('fisheryRightsAvailable', True),
+            "fisheryRightsFetchedAt": result.get('fisheryRightsFetchedAt'),
             "timestamp": datetime.utcnow().isoformat()
         }
+        return response
 
     except Exception as e:
         print(f"\n予期せぬエラー発生: {str(e)}\n")
@@ -0,0 +1,92 @@
+"""
+起動時のimport時間の計測（モジュールごとの内訳と回帰チェック）。
+
+実行コマンド　python -m benchmarks.bench_import_time [--budget-ms 600] [--top 15] [--repeat 3]
+
+frontend.py が起動時にimportするモジュールを新しいプロセスで python -X importtime を付けてimportし、
+時間のかかったモジュールを表示する。次の場合は終了コード1を返す。
+  - 合計のimport時間（--repeat 回の中央値）が --budget-ms を超えた
+  - 遅延importにしたライブラリ（DEFERRED_MODULES）が起動時にimportされている
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# frontend.py が起動時にimportするモジュール（streamlit本体はサーバーが読み込み済みなので除く）
+STARTUP_MODULES = (
+    'backend',
+    'utils.address_api',
+    'utils.prefetch',
+    'utils.session_store',
+    'utils.static_assets',
+    'utils.warmup',
+)
+
+# 最初に使うとき（またはウォームアップ）まで読み込まないモジュール
+DEFERRED_MODULES = (
+    'google.generativeai',
+    'aiohttp',
+    'geopy',
+    'folium',
+    'streamlit_folium',
+    'pillow_heif',
+)
+
+
+def profile_imports() -> Tuple[float, Dict[str, Tuple[float, float]], List[str]]:
+    """(合計秒, {モジュール: (自身の秒, 累計秒)}, 読み込まれた遅延モジュール) を返す"""
+    code = (
+        "import sys\n"
+        f"for name in {STARTUP_MODULES!r}:\n"
+        "    __import__(name)\n"
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))\n"
+    )
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-W', 'ignore', '-c', code],
+                               capture_output=True, text=True, check=True)
+
+    modules = {}
+    total_us = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = len(name) - len(name.lstrip())
+        name = name.strip()
+        modules[name] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+        if depth == 1:
+            # 一番外側のimportの累計を足すと全体の時間になる
+            total_us += int(cumulative_us)
+    loaded_deferred = [m for m in completed.stdout.strip().split(',') if m]
+    return total_us / 1e6, modules, loaded_deferred
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=600, help='合計のimport時間の上限（ミリ秒）')
+    parser.add_argument('--top', type=int, default=15, help='表示するモジュールの数')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    runs = [profile_imports() for _ in range(args.repeat)]
+    total = statistics.median(run[0] for run in runs)
+    _, modules, loaded_deferred = runs[-1]
+
+    print(f"{'モジュール':<50}{'自身':>10}{'累計':>10}")
+    for name, (self_s, cumulative_s) in sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:args.top]:
+        print(f"{name:<50}{self_s * 1000:>8.1f}ms{cumulative_s * 1000:>8.1f}ms")
+    print(f"\n合計: {total * 1000:.0f}ms（上限 {args.budget_ms:.0f}ms、{args.repeat}回の中央値）")
+
+    failed = False
+    if total * 1000 > args.budget_ms:
+        print("⚠️ 起動時のimport時間が上限を超えています")
+        failed = True
+    if loaded_deferred:
+        print(f"⚠️ 遅延importのはずのモジュールが起動時に読み込まれています: {', '.join(loaded_deferred)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+画像前処理のベンチマーク（従来の全解像度デコード vs preprocess_image）。
+
+実行コマンド　python -m benchmarks.bench_preprocess [--repeat N] [--mp 12 48] [画像ファイル ...]
+
+画像ファイルを指定しない場合は、スマートフォン写真相当の大きさのJPEG / PNG / HEICを生成して計測する。
+"""
+import argparse
+import io
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from utils.image_preprocess import UPLOAD_MAX_SIDE, preprocess_image, register_heif_opener
+
+
+def baseline(data: bytes) -> bytes:
+    # 変更前のfrontend.pyと同じ処理（プレビュー用と送信用で2回デコードする）
+    Image.open(io.BytesIO(data)).load()
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((UPLOAD_MAX_SIDE, UPLOAD_MAX_SIDE))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def synthetic_photo(megapixels: float) -> Image.Image:
+    # 写真に近い（なめらかな変化＋ノイズ）4:3の画像
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = height * 4 // 3
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    rng = np.random.default_rng(0)
+    channels = [
+        128 + 100 * np.sin(6 * x + 3 * y),
+        128 + 100 * np.cos(4 * y - 2 * x),
+        128 + 80 * np.sin(5 * (x + y)),
+    ]
+    pixels = np.stack(channels, axis=-1) + rng.normal(0, 12, (height, width, 1))
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "RGB")
+    exif = Image.Exif()
+    exif[0x0112] = 6  # 縦持ちで撮影した写真
+    image.info["exif"] = exif.tobytes()
+    return image
+
+
+def encode(image: Image.Image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        image.save(buffer, format="JPEG", quality=92, exif=image.info["exif"])
+    elif fmt == "PNG":
+        image.save(buffer, format="PNG", compress_level=1)
+    else:
+        image.save(buffer, format="HEIF", quality=80, exif=image.info["exif"])
+    return buffer.getvalue()
+
+
+def measure(fn: Callable[[bytes], object], data: bytes, repeat: int) -> float:
+    fn(data)  # ウォームアップ
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(data)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def build_inputs(megapixels: List[float], paths: List[str]) -> List[Tuple[str, bytes]]:
+    if paths:
+        inputs = []
+        for path in paths:
+            with open(path, "rb") as f:
+                inputs.append((path, f.read()))
+        return inputs
+
+    formats = ["JPEG", "PNG"] + (["HEIF"] if register_heif_opener() else [])
+    inputs = []
+    for mp in megapixels:
+        image = synthetic_photo(mp)
+        for fmt in formats:
+            inputs.append((f"{fmt} {mp:g}MP", encode(image, fmt)))
+    return inputs
+
+
+def main() -> List[Dict]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="計測する画像ファイル")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mp", type=float, nargs="+", default=[12, 48], help="生成する画像の画素数（メガピクセル）")
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'入力':<14}{'サイズ':>10}{'従来':>10}{'前処理':>10}{'倍率':>8}  出力")
+    for name, data in build_inputs(args.mp, args.paths):
+        try:
+            before = measure(baseline, data, args.repeat)
+            after = measure(preprocess_image, data, args.repeat)
+            result = preprocess_image(data)
+        except (OSError, ValueError) as e:
+            # エンコーダーで作った大きなHEICは、タイル分割されていないためデコーダーの上限を超えることがある
+            print(f"{name:<14}{len(data) / 1e6:>8.1f}MB  スキップ: {e}")
+            continue
+        rows.append({"input": name, "bytes": len(data), "baseline": before, "preprocess": after})
+        print(f"{name:<14}{len(data) / 1e6:>8.1f}MB{before * 1000:>8.0f}ms{after * 1000:>8.0f}ms"
+              f"{before / after:>7.1f}x  {result['width']}x{result['height']}")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+送信画像の予算ごとの識別精度の評価（オフライン評価。Gemini APIを実際に呼び出す）。
+
+実行コマンド　python -m benchmarks.eval_upload_budget 画像セット [--budgets 0 400000 200000 100000] [--format jpeg]
+                                                   [--prefecture 神奈川県] [--json 結果.json]
+
+画像セットは次のどちらか:
+  - CSVファイル（列: path, fishNameJa, scientificName(省略可)。pathはCSVからの相対パスでもよい）
+  - 魚種名のサブディレクトリに画像を入れたディレクトリ（例: マダイ/001.jpg）
+
+予算ごとに preprocess_image で送信用の画像を作り、identify_and_analyze_fish で識別した魚種名を正解と比べて、
+正解率・送信サイズ・エンコード時間・識別の待ち時間を表示する。位置は指定しないので漁業権の検索は行わない。
+"""
+import os
+
+# 予算ごとに画像を識別し直すため、類似画像の識別結果の再利用を無効にする（importより前に設定する）
+os.environ.setdefault('PHASH_MAX_DISTANCE', '-1')
+
+import argparse
+import csv
+import json
+import statistics
+import time
+from typing import Dict, List, Optional
+
+from utils.gemini_api import identify_and_analyze_fish
+from utils.image_preprocess import preprocess_image
+from utils.species_matcher import normalize_name
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.heic', '.heif', '.webp')
+
+
+def load_labeled_set(path: str) -> List[Dict]:
+    samples = []
+    if os.path.isdir(path):
+        for label in sorted(os.listdir(path)):
+            label_dir = os.path.join(path, label)
+            if not os.path.isdir(label_dir):
+                continue
+            for name in sorted(os.listdir(label_dir)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    samples.append({'path': os.path.join(label_dir, name), 'fishNameJa': label, 'scientificName': ''})
+        return samples
+
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            image_path = row['path'] if os.path.isabs(row['path']) else os.path.join(base, row['path'])
+            samples.append({
+                'path': image_path,
+                'fishNameJa': row.get('fishNameJa', ''),
+                'scientificName': row.get('scientificName') or '',
+            })
+    return samples
+
+
+def is_correct(sample: Dict, result: Dict) -> bool:
+    if not result.get('success'):
+        return False
+    expected_scientific = sample['scientificName'].strip().lower()
+    if expected_scientific and expected_scientific == result.get('scientificName', '').strip().lower():
+        return True
+    # 漢字表記の揺れがあるので、ひらがなの名前とも比べる
+    expected = normalize_name(sample['fishNameJa'])
+    return expected in (normalize_name(result.get('fishNameJa', '')), normalize_name(result.get('fishNameHira', '')))
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def evaluate_budget(samples: List[Dict], budget: int, upload_format: Optional[str], prefecture: str) -> Dict:
+    correct = 0
+    sizes, encode_times, latencies, failures = [], [], [], []
+    for sample in samples:
+        with open(sample['path'], 'rb') as f:
+            data = f.read()
+        started = time.perf_counter()
+        prepared = preprocess_image(data, byte_budget=budget, upload_format=upload_format)
+        encode_times.append(time.perf_counter() - started)
+        sizes.append(len(prepared['imageBytes']))
+
+        started = time.perf_counter()
+        result = identify_and_analyze_fish(prepared['imageBytes'], prefecture)
+        latencies.append(time.perf_counter() - started)
+        if is_correct(sample, result):
+            correct += 1
+        else:
+            failures.append({'path': sample['path'], 'expected': sample['fishNameJa'],
+                             'actual': result.get('fishNameJa') or result.get('message', '')})
+
+    return {
+        'budget': budget,
+        'format': upload_format or 'jpeg',
+        'samples': len(samples),
+        'accuracy': correct / len(samples),
+        'meanBytes': statistics.mean(sizes),
+        'meanEncodeMs': statistics.mean(encode_times) * 1000,
+        'meanLatency': statistics.mean(latencies),
+        'p95Latency': percentile(latencies, 95),
+        'failures': failures,
+    }
+
+
+def main() -> List[Dict]:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dataset', help='ラベル付き画像セット（CSVファイルまたはディレクトリ）')
+    parser.add_argument('--budgets', type=int, nargs='+', default=[0, 400000, 200000, 100000],
+                        help='送信画像のバイト数の予算（0は無制限）')
+    parser.add_argument('--format', choices=['jpeg', 'webp'], default=None, help='送信画像の形式')
+    parser.add_argument('--prefecture', default='神奈川県')
+    parser.add_argument('--json', help='結果を書き出すJSONファイル')
+    args = parser.parse_args()
+
+    samples = load_labeled_set(args.dataset)
+    if not samples:
+        parser.error(f'画像が見つかりません: {args.dataset}')
+
+    rows = []
+    print(f"{'予算':>10}{'正解率':>8}{'平均サイズ':>12}{'エンコード':>10}{'平均':>8}{'p95':>8}")
+    for budget in args.budgets:
+        row = evaluate_budget(samples, budget, args.format, args.prefecture)
+        rows.append(row)
+        label = '無制限' if budget == 0 else f'{budget / 1000:.0f}KB'
+        print(f"{label:>10}{row['accuracy']:>8.1%}{row['meanBytes'] / 1000:>10.0f}KB"
+              f"{row['meanEncodeMs']:>8.0f}ms{row['meanLatency']:>7.2f}s{row['p95Latency']:>7.2f}s")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    return rows
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+セッションが保持する画像・判定結果のメモリ使用量（RSS）の計測。
+
+実行コマンド　python -m benchmarks.measure_session_memory [--sessions 200] [--mp 12] [--format PNG] [--budget-mb 128]
+
+従来（アップロードファイル・送信用画像・プレビュー・判定結果をすべてセッションに保持）と、
+変更後（前処理済みの画像を共有ストアに預け、セッションにはキーとハッシュと表示用の結果だけを保持）を
+それぞれ別プロセスで再現し、セッション数に対するRSSの増え方を比べる。
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+from typing import Dict
+
+# 判定結果の例（漁業権の検索結果などを含む、表示に使わない項目も含めた大きさ）
+SAMPLE_RESULT = {
+    "success": True,
+    "fromCache": False,
+    "isLegal": False,
+    "fishNameJa": "マダイ",
+    "fishNameEn": "Red seabream",
+    "scientificName": "Pagrus major",
+    "gyogyoken": "第1種共同漁業権（あわび、さざえ、なまこ）" * 4,
+    "isEdible": True,
+    "isPoisonous": False,
+    "protectedSpecies": ["あわび", "さざえ", "なまこ", "いせえび", "たこ"] * 10,
+    "fisheryRightsStale": False,
+    "fisheryRightsAvailable": True,
+    "fisheryRightsFetchedAt": None,
+    "timestamp": "2026-01-01T00:00:00",
+}
+
+
+def rss_bytes() -> int:
+    # 現在のRSS（/procが無い環境では最大RSS）
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def simulate(mode: str, sessions: int, megapixels: float, fmt: str, budget_mb: float) -> Dict:
+    os.environ['SESSION_IMAGE_BUDGET_MB'] = str(budget_mb)
+    from benchmarks.bench_preprocess import encode, synthetic_photo
+    from utils.image_preprocess import preprocess_image
+    from utils.session_store import compact_result, get_session_image_store
+
+    upload = encode(synthetic_photo(megapixels), fmt)
+    processed = preprocess_image(upload)
+    store = get_session_image_store()
+
+    baseline = rss_bytes()
+    states = []
+    for _ in range(sessions):
+        # セッションごとに別のオブジェクトとして保持する（実際のアップロードも別々のバイト列になる）
+        if mode == 'before':
+            states.append({
+                'uploaded_file': bytearray(upload),
+                'image_bytes': bytes(bytearray(processed['imageBytes'])),
+                'preview_bytes': bytes(bytearray(processed['previewBytes'])),
+                'result': json.loads(json.dumps(SAMPLE_RESULT)),
+            })
+        else:
+            key = store.put(bytes(bytearray(processed['imageBytes'])), bytes(bytearray(processed['previewBytes'])))
+            states.append({
+                'image_key': key,
+                'image_hash': store.get(key)['imageHash'],
+                'result': compact_result(json.loads(json.dumps(SAMPLE_RESULT))),
+            })
+    grown = rss_bytes() - baseline
+    return {
+        'mode': mode,
+        'sessions': sessions,
+        'uploadBytes': len(upload),
+        'rssGrowth': grown,
+        'perSession': grown / sessions,
+        'store': store.stats() if mode == 'after' else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--mp', type=float, default=12, help='アップロード画像の画素数（メガピクセル）')
+    parser.add_argument('--format', default='PNG', choices=['JPEG', 'PNG', 'HEIF'])
+    parser.add_argument('--budget-mb', type=float, default=128, help='SESSION_IMAGE_BUDGET_MB')
+    parser.add_argument('--mode', choices=['before', 'after'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # 子プロセスとして1つのモードだけを計測する
+        print(json.dumps(simulate(args.mode, args.sessions, args.mp, args.format, args.budget_mb)))
+        return
+
+    print(f"{'方式':<8}{'セッション':>10}{'RSS増加':>12}{'1セッション':>14}")
+    for mode in ('before', 'after'):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.measure_session_memory', '--mode', mode,
+             '--sessions', str(args.sessions), '--mp', str(args.mp), '--format', args.format,
+             '--budget-mb', str(args.budget_mb)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        row = json.loads(output.strip().splitlines()[-1])
+        label = '従来' if mode == 'before' else '変更後'
+        print(f"{label:<8}{row['sessions']:>10}{row['rssGrowth'] / 1e6:>10.1f}MB{row['perSession'] / 1e3:>12.0f}KB")
+        if row['store']:
+            print(f"        ストア: {row['store']['entries']}件 {row['store']['bytes'] / 1e6:.1f}MB"
+                  f"（削除 {row['store']['evictions']}件）")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,23 @@
 # frontend.py
 # 実行コマンド　streamlit run frontend.py
 import streamlit as st  # GUI作成、サーバー作成
-from PIL import Image, ImageOps  # 画像の取り扱い
-import pillow_heif
-import folium  # mapデータ
-from streamlit_folium import st_folium  # map表示
-from folium.plugins import LocateControl # 現在地取得用
-from geopy.geocoders import ArcGIS  # マップ情報から緯度経度を取得
-import base64  # 画像の形式を変換
-import requests  # API使用
-import io  # bytes処理用
+import os
 import time
 
-from backend import identify_and_check_fish  # backedの関数呼び出し
+from backend import identify_and_check_fish, preprocess_image_in_pool  # backedの関数呼び出し
+from backend import cancel_speculative_identification, start_speculative_identification  # 魚種識別の先行実行
+from utils.address_api import search_address_by_location  # 逆ジオコーディング
+from utils.prefetch import create_fishery_prefetcher  # 漁業権の先読み
+from utils.session_store import compact_result, get_session_image_store  # セッションの画像をメモリ予算内で保持
+from utils.static_assets import publish_assets  # 画像・動画の静的ファイル配信
+from utils.warmup import start_warmup  # 遅延importしたライブラリの裏での読み込み
 
-# heifに対応させるpillow設定
-pillow_heif.register_heif_opener()
 
-# geolocatorインスタンス作成　update_addressの逆ジオコーディングを実行するため
-geolocator = ArcGIS(user_agent="uochecker-app-v1.0", timeout=10)
+@st.cache_resource
+def get_geolocator():
+    # 地名検索用のgeolocator（geopyは最初の検索かウォームアップで読み込む。接続は共通HTTPレイヤーで使い回す）
+    from utils.geocoder import create_geolocator
+    return create_geolocator()
 
 
 def update_address(location_list):
@@ -33,30 +32,20 @@ def update_address(location_list):
     # 緯度経度に分割
     lat, lng = location_list
 
-    # HeartRails GeoAPIのための設定
-    url = " https://geoapi.heartrails.com/api/json?method=searchByGeoLocation"
-    params = {
-        "method": "searchByGeoLocation",
-        "x": lng,  # 経度
-        "y": lat  # 緯度
-    }
+    # 住所の取得と並行して、この地点の漁業権を裏で先読みする
+    prefetch_fishery_rights(lat, lng)
 
     try:
-        response = requests.get(url, params=params, timeout=5)
-        data = response.json()
+        # HeartRails GeoAPIで住所を取得
+        loc = search_address_by_location(lat, lng)
 
         # データ構造の確認
-        if "response" in data and "location" in data["response"]:
-            loc = data["response"]["location"][0]  # 最も近い住所を取得
-
-            # 日本語住所を結合
-            address_text = f"{loc['prefecture']}{loc['city']}{loc['town']}"
-
+        if loc:
             # 住所を保存
-            st.session_state.marker_address = address_text
-            st.session_state.current_prefecture = loc['prefecture']
-            st.session_state.current_city = loc['city']
-            return address_text
+            st.session_state.marker_address = loc["address"]
+            st.session_state.current_prefecture = loc["prefecture"]
+            st.session_state.current_city = loc["city"]
+            return loc["address"]
 
         else:
             st.session_state.marker_address = "住所不明（海上など）"
@@ -70,12 +59,75 @@ def update_address(location_list):
         st.session_state.current_city = ""
         return None
 
-def load_history(load_history):
+def prefetch_fishery_rights(lat, lng):
+    # マーカーが動いた地点の漁業権を共有キャッシュに先読みする（前の地点の先読みはキャンセル）
+    if "fishery_prefetcher" not in st.session_state:
+        st.session_state.fishery_prefetcher = create_fishery_prefetcher()
+    try:
+        st.session_state.fishery_prefetcher.move_to(lat, lng)
+    except Exception as e:
+        print(f"漁業権の先読みエラー: {e}")
+
+
+def prepare_image(uploaded_file):
+    """
+    アップロードされた画像を別プロセスで1回だけデコードして、送信用の画像とプレビューを共有ストアに保存する関数
+    セッションにはストアのキーと画像のハッシュだけを持ち、アップロードされたファイルそのものは残さない
+    """
+    processed = preprocess_image_in_pool(uploaded_file.getvalue())
+    store = get_session_image_store()
+    store.discard(st.session_state.image_key)
+    st.session_state.image_key = store.put(processed["imageBytes"], processed["previewBytes"])
+    st.session_state.image_hash = store.get(st.session_state.image_key)["imageHash"]
+    return processed["imageBytes"]
+
+
+def get_session_image():
+    # 保存した画像を返す（メモリ予算を超えて削除されていればNone）
+    return get_session_image_store().get(st.session_state.image_key)
+
+
+def start_speculation(uploaded_file):
+    # 画像が選ばれた時点で前処理し、魚種識別を先に始める（マーカーを調整している間に識別を済ませる）
+    clear_uploaded_image()
+    # アップロード欄を作り直して、Streamlitが保持しているアップロードファイルを手放す
+    st.session_state.uploader_generation += 1
+    try:
+        image_bytes = prepare_image(uploaded_file)
+    except Exception as e:
+        print(f"画像の読み込みエラー: {e}")
+        st.session_state.search_error = f"画像を読み込めませんでした: {e}"
+        return
+    st.session_state.search_error = None
+    try:
+        if os.environ.get("SPECULATIVE_IDENTIFICATION", "1") != "0":
+            st.session_state.species_job = start_speculative_identification(image_bytes)
+    except Exception as e:
+        print(f"先行識別エラー: {e}")
+
+
+def clear_uploaded_image():
+    # 画像の選択を解除し、使われなくなった先行識別を止める
+    cancel_speculative_identification(st.session_state.get("species_job"))
+    get_session_image_store().discard(st.session_state.get("image_key"))
+    st.session_state.species_job = None
+    st.session_state.image_key = None
+    st.session_state.image_hash = None
+
+
+def expire_uploaded_image():
+    # 保存した画像がメモリ予算を超えて削除されていた場合は、もう一度選んでもらう
+    clear_uploaded_image()
+    st.session_state.search_error = "一定時間操作がなかったため画像を破棄しました。もう一度画像を選択してください。"
+
+
+def load_history(load_history, scope="app"):
     # マーカーの位置を表示
     load_location = [load_history["lat"], load_history["lng"]]
     st.session_state.center = load_location
     st.session_state.marker_location = load_location
     st.session_state.zoom = 15
+    prefetch_fishery_rights(load_location[0], load_location[1])
 
     # 住所情報の更新
     st.session_state.marker_address = load_history["address"]
@@ -84,13 +136,179 @@ def load_history(load_history):
 
     st.session_state.search_error = None
     st.session_state.marker_auto = False
-    st.rerun()
+    st.rerun(scope=scope)
+
 
-@st.cache_resource# 動画をキャッシュ化
-def get_base64_video(path):
-    with open(path, "rb") as f:
-        data = f.read()
-    return base64.b64encode(data).decode("utf-8")
+@st.fragment
+def render_location_panel():
+    """
+    地名検索・マップ・選択中の住所の表示（部分再実行のフラグメント）
+    マップのクリックや検索ではこの部分だけを再実行し、ページ全体（CSS・タイトル画像・プレビュー）は作り直さない
+    """
+    # foliumは読み込みに時間がかかるので、マップを表示するときに読み込む（タイトルやアップロード欄を先に表示する）
+    import folium  # mapデータ
+    from folium.plugins import LocateControl  # 現在地取得用
+    from streamlit_folium import st_folium  # map表示
+
+    with st.container():
+        # マップ表示
+        # 検索機能
+        col_search_in, col_search_btn = st.columns([6, 2])
+        with col_search_in:  # マップ検索入力欄表示
+            st.markdown(
+                """
+                <style>                
+                div[data-testid="stTextInput"] {
+                    margin-top: -1rem;
+                }
+
+                div[data-testid="stTextInput"] input {
+                    background-color: 262730;
+                    color: #FFFFFF;
+                }
+                </style>
+                """,
+                unsafe_allow_html=True
+            )
+            search_map = st.text_input(
+                "地名検索", placeholder="例：西宮駅", label_visibility="collapsed"
+            )
+        with col_search_btn:  # 検索ボタン表示
+            search_clicked = st.button("検索", type="primary")
+            if search_clicked or (search_map and search_map != st.session_state.search_map):
+                st.session_state.search_map = search_map
+                st.session_state.search_error = None
+
+                # 重複チェック
+                search_location = next((item for item in st.session_state.search_history if item["name"] == search_map), None)
+                if search_location: # 履歴にある場合呼び出し
+                    load_history(search_location, scope="fragment")
+                else: # 履歴にない場合登録
+                    location = None
+                    try:
+                        location = get_geolocator().geocode(search_map)
+                    except Exception as e:
+                        st.error(f"エラーが発生しました: {e}")
+                    if location:
+                        new_location = [location.latitude, location.longitude]
+                        st.session_state.center = new_location
+                        st.session_state.marker_location = new_location
+                        st.session_state.zoom = 15
+                        update_address(st.session_state.marker_location)
+
+                        # 履歴登録
+                        if search_map:
+                            # 履歴を住所名、緯度、経度で保存
+                            new_history = {
+                                "name": search_map,
+                                "lat": location.latitude,
+                                "lng": location.longitude,
+                                "address": st.session_state.marker_address,
+                                "prefecture": st.session_state.current_prefecture,
+                                "city": st.session_state.current_city
+                            }
+
+                            # 履歴をセッションに保存
+                            st.session_state.search_history.insert(0, new_history)
+                            # 履歴が3件を超えたら古い履歴から削除
+                            if len(st.session_state.search_history) > 3:
+                                st.session_state.search_history.pop()
+                        st.rerun()  # 検索履歴はフラグメントの外に表示するのでページ全体を再実行する
+                    else:
+                        st.session_state.search_error = f"「{search_map}」は見つかりませんでした。別の地名で試してください。"
+
+        # マップ表示コンテナ
+        with st.container():
+            gps_zoom = 14
+
+            map_preview = folium.Map(
+                location=st.session_state.center,
+                zoom_start=st.session_state.zoom,
+                tiles="https://mt1.google.com/vt/lyrs=r&x={x}&y={y}&z={z}",
+                attr="Google Maps",
+            )
+            if st.session_state.marker_auto: # 初回起動時に現在地を取得
+                # マップが読み込み時にGPS情報を取得
+                LocateControl(
+                    auto_start=True,  # 自動的に現在地を取得
+                    strings={"title": "現在地を表示", "popup": "現在地"},
+                    locateOptions={
+                        "enableHighAccuracy": True,
+                        "maxZoom": gps_zoom,
+                    }
+                ).add_to(map_preview)
+
+            # マーカー表示
+            folium.Marker(
+                location=st.session_state.marker_location,
+                popup=f"{st.session_state.marker_location}",
+                icon=folium.Icon(color="red", icon="map-marker", prefix="fa"),
+            ).add_to(map_preview)
+
+            # マップ表示
+            map_folium = st_folium(
+                map_preview,
+                height=400,
+                use_container_width=True,
+                returned_objects=["last_clicked","center","zoom"],
+            )
+
+            if st.session_state.marker_auto and map_folium and map_folium.get("center") and map_folium.get("zoom"):
+                center_loc = [
+                    map_folium["center"]["lat"],
+                    map_folium["center"]["lng"],
+                ]
+                current_zoom = map_folium["zoom"]
+                if center_loc != [34.694659, 135.194954] and current_zoom == gps_zoom:
+                    st.session_state.marker_auto = False
+                    st.session_state.marker_location = center_loc
+                    st.session_state.center = center_loc
+                    st.session_state.zoom = current_zoom
+                    update_address(st.session_state.marker_location)
+                    st.rerun(scope="fragment")
+
+            # マップがクリックされたら緯度経度を取得してマーカーを更新
+            if map_folium and map_folium.get("last_clicked"):
+                clicked_loc = [
+                    map_folium["last_clicked"]["lat"],
+                    map_folium["last_clicked"]["lng"],
+                ]
+                if clicked_loc != st.session_state.marker_location:
+                    st.session_state.marker_location = clicked_loc
+                    st.session_state.center = clicked_loc
+                    st.session_state.zoom = 15
+                    update_address(st.session_state.marker_location)
+                    st.session_state.marker_auto = False
+                    st.rerun(scope="fragment")
+
+        # sessionを変数に変換
+        marker_address = st.session_state.marker_address
+
+        # 現在選択中の位置の表示
+        st.markdown(
+            f"""
+                <div style="background: rgba(255,255,255,0.1); padding: 0.94rem; border-radius: 0.5rem; margin-top: -0.625rem; margin-bottom: 0.625rem; text-align: center;"> <span style="font-size: 0.9em; color: white;">現在選択中の位置:</span><br>
+                    <strong style="color: white; font-size: 1.1em;">{marker_address}</strong>
+                </div>
+            """,
+            unsafe_allow_html=True,
+        )
+    if st.session_state.search_error:
+        st.warning(st.session_state.search_error)
+
+
+@st.cache_resource  # 起動時に1回だけ配置する
+def get_asset_urls():
+    # 画像・動画をハッシュ付きのファイル名で ./static に置き、ページからはURLで参照する
+    return publish_assets(
+        {
+            "title_logo": "image/title_logo.png",
+            "title_sub": "image/title_sub.png",
+            "img_preview_text": "image/img_preview_text.png",
+            "wave_load": "image/wave_load.mp4",
+        },
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"),
+    )
 
 # streamlitのページ設定
 st.set_page_config(page_title="UOチェッカー", layout="wide")
@@ -110,8 +328,12 @@ if "current_city" not in st.session_state:  # 市区町村を保存するセッ
     st.session_state.current_city = ""
 if "zoom" not in st.session_state:  # マップのズーム倍率の初期設定
     st.session_state.zoom = 8
-if "uploaded_file" not in st.session_state:  # アップロードファイルの初期設定
-    st.session_state.uploaded_file = None
+if "image_key" not in st.session_state:  # 前処理済みの画像を共有ストアから取り出すキー
+    st.session_state.image_key = None
+if "image_hash" not in st.session_state:  # 前処理済みの画像のハッシュ
+    st.session_state.image_hash = None
+if "uploader_generation" not in st.session_state:  # アップロード欄を作り直すための番号
+    st.session_state.uploader_generation = 0
 if "result" not in st.session_state:  # 結果の初期設定
     st.session_state.result = None
 if "search_map" not in st.session_state:
@@ -122,14 +344,11 @@ if "search_history" not in st.session_state:  # 検索履歴リストの初期
     st.session_state.search_history = []
 if "run_process" not in st.session_state:
     st.session_state.run_process = False
+if "species_job" not in st.session_state:  # 先行して実行中の魚種識別
+    st.session_state.species_job = None
 
-# 画像を選択画像の読み込み
-with open("image/img_preview_text.png", "rb") as img_preview_text_img:
-    img_preview_text_data = img_preview_text_img.read()
-    img_preview_text_base64 = base64.b64encode(img_preview_text_data).decode("utf-8")
-
-# ロード画面用の事前読み込み
-wave_load_base64 = get_base64_video("image/wave_load.mp4")
+# 画像・動画のURL（静的ファイル配信）
+asset_urls = get_asset_urls()
 
 wave_load_html = f"""
                     <style>
@@ -157,7 +376,7 @@ wave_load_html = f"""
                     </style>
                     <div class="loader-overlay">
                         <video autoplay loop muted playsinline style="width: 9.375rem; height: auto;">
-                            <source src="data:video/mp4;base64,{wave_load_base64}" type="video/mp4">
+                            <source src="{asset_urls['wave_load']}" type="video/mp4">
                             お使いのブラウザは動画タグをサポートしていません。
                         </video>
                         <div class="loader-text">魚を識別中...</div>
@@ -418,7 +637,7 @@ st.markdown(
     width: 90%;
     height: 50%;
     
-    background-image: url("data:image/png;base64,{img_preview_text_base64}");
+    background-image: url("{asset_urls['img_preview_text']}");
     background-size: contain;
     background-repeat: no-repeat;
     background-position: center;
@@ -434,41 +653,39 @@ col_main_left, col_main_right = st.columns([1, 1], gap="small")  # 1:1の比率
 
 # 左カラム タイトル表示と画像プレビュー表示
 with col_main_left:
-    # タイトル表示
-    # タイトルロゴ画像を読み込んでbase64形式に変換
-    with open("image/title_logo.png", "rb") as title_logo_img:
-        title_logo_data = title_logo_img.read()
-        title_logo_base64 = base64.b64encode(title_logo_data).decode("utf-8")
-    # サブタイトル画像を読み込んでbase64形式に変換
-    with open("image/title_sub.png", "rb") as title_sub_img:
-        title_sub_data = title_sub_img.read()
-        title_sub_base64 = base64.b64encode(title_sub_data).decode("utf-8")
+    # タイトル表示（タイトルロゴ・サブタイトル画像は静的ファイルのURLで参照する）
 
     st.markdown(
         f"""
     <div style="text-align: center; margin-top: 0rem; margin-bottom: 2rem; display: flex; flex-direction: column; align-items: center; gap: 1rem;">
-        <img src="data:image/gif;base64,{title_logo_base64}" style="width: 50rem;pointer-events: none; -webkit-user-drag: none;">
-        <img src="data:image/gif;base64,{title_sub_base64}" style="width: 30rem;pointer-events: none; -webkit-user-drag: none;">
+        <img src="{asset_urls['title_logo']}" style="width: 50rem;pointer-events: none; -webkit-user-drag: none;">
+        <img src="{asset_urls['title_sub']}" style="width: 30rem;pointer-events: none; -webkit-user-drag: none;">
     </div>
         """,
         unsafe_allow_html=True,
     )
     # 画像プレビュー表示
-    if st.session_state.uploaded_file is None:  # 画像がアップロードされていない場合
+    if st.session_state.image_key is None:  # 画像がアップロードされていない場合
         col_up_left, col_up_center, col_up_right = st.columns([1, 3, 1])
         with col_up_center:
             # 画像プレビュー表示
-            if st.session_state.uploaded_file is None:  # 画像がアップロードされていない場合
+            if st.session_state.image_key is None:  # 画像がアップロードされていない場合
                 col_up_left, col_up_center, col_up_right = st.columns([1, 3, 1])
                 with col_up_center:
-                    uploaded_file = st.file_uploader("", type=["png", "jpg", "jpeg","heif","heic","HEIC"])
+                    uploaded_file = st.file_uploader("", type=["png", "jpg", "jpeg","heif","heic","HEIC"],
+                                                     key=f"uploader_{st.session_state.uploader_generation}")
                     if uploaded_file is not None:
-                        st.session_state.uploaded_file = uploaded_file
+                        start_speculation(uploaded_file)
                         st.session_state.marker_auto = False
                         st.rerun()
     else:  # 画像がアップロードされた場合
         try:
-            image = Image.open(st.session_state.uploaded_file)  # 画像を読み込み
+            # アップロード時に作ったプレビューを表示する
+            stored_image = get_session_image()
+            if stored_image is None:
+                expire_uploaded_image()
+                st.rerun()
+            image = stored_image["previewBytes"]
             col_image_left, col_image_center, col_image_right = st.columns([1, 3, 1])  # 画像を中央に揃える
             with col_image_center:  # 中央に画像を表示
                 st.image(
@@ -477,13 +694,13 @@ with col_main_left:
                     width="stretch",
                 )
                 if st.button("別の画像を選択", use_container_width=True,type="primary"):
-                    st.session_state.uploaded_file = None
+                    clear_uploaded_image()
                     st.session_state.result = None
                     st.session_state.marker_auto = False
                     st.rerun()
         except Exception as e:
             st.error(f"読み込みエラー: {e}")
-            st.session_state.uploaded_file = None
+            clear_uploaded_image()
 
 # 右カラム マップ表示　結果表示
 with col_main_right:
@@ -497,154 +714,11 @@ with col_main_right:
             unsafe_allow_html=True,
         )
 
-        with st.container():
-            # マップ表示
-            # 検索機能
-            col_search_in, col_search_btn = st.columns([6, 2])
-            with col_search_in:  # マップ検索入力欄表示
-                st.markdown(
-                    """
-                    <style>                
-                    div[data-testid="stTextInput"] {
-                        margin-top: -1rem;
-                    }
-                    
-                    div[data-testid="stTextInput"] input {
-                        background-color: 262730;
-                        color: #FFFFFF;
-                    }
-                    </style>
-                    """,
-                    unsafe_allow_html=True
-                )
-                search_map = st.text_input(
-                    "地名検索", placeholder="例：西宮駅", label_visibility="collapsed"
-                )
-            with col_search_btn:  # 検索ボタン表示
-                search_clicked = st.button("検索", type="primary")
-                if search_clicked or (search_map and search_map != st.session_state.search_map):
-                    st.session_state.search_map = search_map
-                    st.session_state.search_error = None
-
-                    # 重複チェック
-                    search_location = next((item for item in st.session_state.search_history if item["name"] == search_map), None)
-                    if search_location: # 履歴にある場合呼び出し
-                        load_history(search_location)
-                    else: # 履歴にない場合登録
-                        location = None
-                        try:
-                            location = geolocator.geocode(search_map)
-                        except Exception as e:
-                            st.error(f"エラーが発生しました: {e}")
-                        if location:
-                            new_location = [location.latitude, location.longitude]
-                            st.session_state.center = new_location
-                            st.session_state.marker_location = new_location
-                            st.session_state.zoom = 15
-                            update_address(st.session_state.marker_location)
-
-                            # 履歴登録
-                            if search_map:
-                                # 履歴を住所名、緯度、経度で保存
-                                new_history = {
-                                    "name": search_map,
-                                    "lat": location.latitude,
-                                    "lng": location.longitude,
-                                    "address": st.session_state.marker_address,
-                                    "prefecture": st.session_state.current_prefecture,
-                                    "city": st.session_state.current_city
-                                }
-
-                                # 履歴をセッションに保存
-                                st.session_state.search_history.insert(0, new_history)
-                                # 履歴が3件を超えたら古い履歴から削除
-                                if len(st.session_state.search_history) > 3:
-                                    st.session_state.search_history.pop()
-                            st.rerun()
-                        else:
-                            st.session_state.search_error = f"「{search_map}」は見つかりませんでした。別の地名で試してください。"
-
-            # マップ表示コンテナ
-            with st.container():
-                gps_zoom = 14
-
-                map_preview = folium.Map(
-                    location=st.session_state.center,
-                    zoom_start=st.session_state.zoom,
-                    tiles="https://mt1.google.com/vt/lyrs=r&x={x}&y={y}&z={z}",
-                    attr="Google Maps",
-                )
-                if st.session_state.marker_auto: # 初回起動時に現在地を取得
-                    # マップが読み込み時にGPS情報を取得
-                    LocateControl(
-                        auto_start=True,  # 自動的に現在地を取得
-                        strings={"title": "現在地を表示", "popup": "現在地"},
-                        locateOptions={
-                            "enableHighAccuracy": True,
-                            "maxZoom": gps_zoom,
-                        }
-                    ).add_to(map_preview)
-
-                # マーカー表示
-                folium.Marker(
-                    location=st.session_state.marker_location,
-                    popup=f"{st.session_state.marker_location}",
-                    icon=folium.Icon(color="red", icon="map-marker", prefix="fa"),
-                ).add_to(map_preview)
-
-                # マップ表示
-                map_folium = st_folium(
-                    map_preview,
-                    height=400,
-                    use_container_width=True,
-                    returned_objects=["last_clicked","center","zoom"],
-                )
-
-                if st.session_state.marker_auto and map_folium and map_folium.get("center") and map_folium.get("zoom"):
-                    center_loc = [
-                        map_folium["center"]["lat"],
-                        map_folium["center"]["lng"],
-                    ]
-                    current_zoom = map_folium["zoom"]
-                    if center_loc != [34.694659, 135.194954] and current_zoom == gps_zoom:
-                        st.session_state.marker_auto = False
-                        st.session_state.marker_location = center_loc
-                        st.session_state.center = center_loc
-                        st.session_state.zoom = current_zoom
-                        update_address(st.session_state.marker_location)
-                        st.rerun()
-
-                # マップがクリックされたら緯度経度を取得してマーカーを更新
-                if map_folium and map_folium.get("last_clicked"):
-                    clicked_loc = [
-                        map_folium["last_clicked"]["lat"],
-                        map_folium["last_clicked"]["lng"],
-                    ]
-                    if clicked_loc != st.session_state.marker_location:
-                        st.session_state.marker_location = clicked_loc
-                        st.session_state.center = clicked_loc
-                        st.session_state.zoom = 15
-                        update_address(st.session_state.marker_location)
-                        st.session_state.marker_auto = False
-                        st.rerun()
-
-            # sessionを変数に変換
-            marker_address = st.session_state.marker_address
-
-            # 現在選択中の位置の表示
-            st.markdown(
-                f"""
-                    <div style="background: rgba(255,255,255,0.1); padding: 0.94rem; border-radius: 0.5rem; margin-top: -0.625rem; margin-bottom: 0.625rem; text-align: center;"> <span style="font-size: 0.9em; color: white;">現在選択中の位置:</span><br>
-                        <strong style="color: white; font-size: 1.1em;">{marker_address}</strong>
-                    </div>
-                """,
-                unsafe_allow_html=True,
-            )
-        if st.session_state.search_error:
-            st.warning(st.session_state.search_error)
+        # 地名検索・マップ・選択中の住所はフラグメントにして、マップ操作ではこの部分だけを再実行する
+        render_location_panel()
 
         if st.button("🐟 魚を判定する", use_container_width=True,type="primary"):
-            if st.session_state.uploaded_file is None:
+            if st.session_state.image_key is None:
                 st.warning("画像をアップロードしてください。")
             elif st.session_state.marker_location is None:
                 st.warning("現在地を選択してください。")
@@ -663,32 +737,27 @@ with col_main_right:
             time.sleep(0.5)
             try:
                 # 魚種判別処理
-                # 画像データ取得
-
-                # 画像を開く
-                image = Image.open(st.session_state.uploaded_file)
-
-                # exifの修正 スマホ画像の向きを直す
-                image = ImageOps.exif_transpose(image)
-
-                # カラーモードをRGBに統一
-                if image.mode != "RGB":
-                    image = image.convert("RGB")
-
-                # 画像をリサイズ
-                image.thumbnail((1568, 1568))
-
-                # バイトデータに変換
-                img_buffer = io.BytesIO()
-                image.save(img_buffer, format="JPEG", quality=95)
-                image_bytes = img_buffer.getvalue()
+                # 画像データ取得（アップロード時に変換済みの画像を使う）
+                stored_image = get_session_image()
+                if stored_image is None:
+                    expire_uploaded_image()
+                    st.rerun()
+                image_bytes = stored_image["imageBytes"]
 
                 prefecture = st.session_state.get("current_prefecture", "")
                 city = st.session_state.get("current_city", "")
 
                 # 漁業権比較処理 引数の値を緯度　経度に変える必要あり
-                result = identify_and_check_fish(image_bytes, prefecture, city,st.session_state.marker_location[0],st.session_state.marker_location[1])
-                st.session_state.result = result
+                # 先行識別を始めていれば、残りの漁業権検索と照合だけを待つ
+                result = identify_and_check_fish(image_bytes, prefecture, city,st.session_state.marker_location[0],st.session_state.marker_location[1],
+                                                 species_job=st.session_state.species_job)
+                if result.get("busy"):
+                    # 混雑中は判定結果ではなく、再試行までの目安を入力画面に表示する
+                    st.session_state.search_error = result.get("message")
+                else:
+                    st.session_state.search_error = None
+                    # セッションには表示に使う項目だけを残す
+                    st.session_state.result = compact_result(result)
 
             except Exception as e:
                 st.error(f"予期せぬエラーが発生しました: {e}")
@@ -723,7 +792,21 @@ with col_main_right:
 
         # 判定結果に基づいたスタイル設定
 
-        if is_legal:
+        if is_legal is None:
+
+            # 漁業権情報を取得できず判定できなかった場合
+
+            status_color = "#ffc107"
+
+            status_bg = "rgba(255, 193, 7, 0.2)"
+
+            status_icon = "？"
+
+            status_label = "確認できません"
+
+            sub_text = "漁業権情報を取得できなかったため、持ち帰れるか判定できませんでした。"
+
+        elif is_legal:
 
             status_color = "#28a745"
 
@@ -771,6 +854,13 @@ with col_main_right:
 
         st.markdown(result_html, unsafe_allow_html=True)
 
+        # 漁業権APIが使えなかった場合の注意表示
+        if result.get("fisheryRightsStale"):
+            fetched_at = (result.get("fisheryRightsFetchedAt") or "")[:10]
+            st.warning(f"最新の漁業権情報を取得できていないため、{fetched_at}時点の漁業権情報で判定しています。最新の情報と異なる可能性があります。")
+        elif result.get("fisheryRightsAvailable") is False:
+            st.warning("漁業権情報を取得できなかったため、漁業権による制限を確認できていません。持ち帰る前に現地のルールを確認してください。")
+
 
         if result.get("fishNameJa"):
             # 毒・危険情報の表示
@@ -824,8 +914,11 @@ with col_main_right:
 
 
         if st.button("別の画像を選択", key="reset_result_btn", use_container_width=True, type="primary"):
-            st.session_state.uploaded_file = None
+            clear_uploaded_image()
             st.session_state.search_map = None
             st.session_state.result = None
             st.session_state.marker_auto = False
-            st.rerun()
\ No newline at end of file
+            st.rerun()
+
+# 最初のページ表示の後に、遅延importしたライブラリを裏で読み込む（プロセスで1回だけ）
+start_warmup()
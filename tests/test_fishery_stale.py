@@ -0,0 +1,95 @@
+"""
+TTL切れの漁業権キャッシュで判定した場合のテスト。
+海しるAPIが遮断中で再取得できない間は、古いデータでの判定であることを結果に示し、結果キャッシュにも保存しない。
+"""
+import os
+import time
+import unittest
+from unittest import mock
+
+import backend
+from utils import fishery_cache, gemini_api
+from utils.circuit_breaker import get_circuit_breaker
+from utils.fishery_cache import DEFAULT_SEARCH_RADIUS, FisheryTileCache, tile_query_for
+from utils.fishery_rights_api import FisheryRightsAPI
+from utils.result_cache import ResultCache
+
+LATITUDE = 35.0
+LONGITUDE = 139.0
+
+
+def _feature_around(latitude: float, longitude: float, species: str):
+    # 地点を囲む小さな区域の漁業権
+    d = 0.001
+    ring = [[longitude - d, latitude - d], [longitude + d, latitude - d], [longitude + d, latitude + d],
+            [longitude - d, latitude + d], [longitude - d, latitude - d]]
+    return {'attributes': {'第一種共同漁業権': species}, 'geometry': {'rings': [ring]}}
+
+
+async def _species(image_bytes, species_job):
+    return {
+        'success': True,
+        'fishNameJa': 'マアジ',
+        'fishNameHira': 'まあじ',
+        'fishNameEn': 'Japanese horse mackerel',
+        'scientificName': 'Trachurus japonicus',
+        'isEdible': True,
+        'isPoisonous': False,
+    }
+
+
+class StaleFisheryTileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.env = mock.patch.dict(os.environ, {'FISHERY_RIGHTS_BACKEND': 'remote', 'FISHERY_NEAREST': '1'})
+        self.env.start()
+        self.tile_cache = FisheryTileCache()
+        self.result_cache = ResultCache()
+        self.patches = [
+            mock.patch.object(fishery_cache, '_tile_cache', self.tile_cache),
+            mock.patch.object(gemini_api, 'get_result_cache', lambda: self.result_cache),
+            mock.patch.object(gemini_api, '_await_species', _species),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+        # 海しるAPIを遮断状態にする
+        self.breaker = get_circuit_breaker('msil')
+        for _ in range(self.breaker.failure_threshold):
+            self.breaker.record_failure()
+        self.assertFalse(self.breaker.allow_request())
+
+        # TTLを過ぎた（stale期間内の）タイルを用意する
+        api = FisheryRightsAPI()
+        tile, _, _, _ = tile_query_for(LATITUDE, LONGITUDE, DEFAULT_SEARCH_RADIUS)
+        self.fetched_at = time.time() - self.tile_cache.ttl_seconds - 60
+        self.tile_cache._tiles[api._cache_key(tile, DEFAULT_SEARCH_RADIUS)] = (
+            self.fetched_at, [_feature_around(LATITUDE, LONGITUDE, 'あわび')]
+        )
+
+    def tearDown(self):
+        self.breaker.record_success()
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.env.stop()
+
+    def test_stale_tile_is_reported_as_stale(self):
+        api = FisheryRightsAPI()
+        features, status, fetched_at = api.search_with_status(LATITUDE, LONGITUDE)
+
+        self.assertEqual(len(features), 1)
+        self.assertEqual(status, 'stale')
+        self.assertEqual(fetched_at, self.fetched_at)
+
+    def test_stale_verdict_is_not_cached(self):
+        result = backend.identify_and_check_fish(b'image', '静岡県', latitude=LATITUDE, longitude=LONGITUDE)
+
+        self.assertTrue(result['success'])
+        self.assertTrue(result['fisheryRightsStale'])
+        self.assertTrue(result['fisheryRightsAvailable'])
+        self.assertIsNotNone(result['fisheryRightsFetchedAt'])
+        self.assertEqual(self.result_cache.stats()['stores'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+結果キャッシュのテスト。
+キャッシュするのは画像ごとの魚種識別だけで、漁業権と持ち帰りの判定はキャッシュヒット時も毎回やり直す。
+"""
+import unittest
+from unittest import mock
+
+import backend
+from utils import gemini_api
+from utils.result_cache import ResultCache
+
+LATITUDE = 35.0
+LONGITUDE = 139.0
+
+
+class SpeciesResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.result_cache = ResultCache()
+        self.gemini_calls = 0
+        self.fishery_rights = {'hasFisheryRights': False, 'protectedSpecies': [], 'restrictions': '特になし'}
+
+        async def identify_species(image_bytes, priority=0):
+            self.gemini_calls += 1
+            return {
+                'success': True,
+                'fishNameJa': 'アワビ',
+                'fishNameHira': 'あわび',
+                'fishNameEn': 'abalone',
+                'scientificName': 'Haliotis',
+                'isEdible': True,
+                'isPoisonous': False,
+            }
+
+        async def fishery_rights(latitude, longitude):
+            return dict(self.fishery_rights)
+
+        self.patches = [
+            mock.patch.object(gemini_api, 'get_result_cache', lambda: self.result_cache),
+            mock.patch.object(gemini_api, '_identify_species', identify_species),
+            mock.patch.object(gemini_api, 'get_fishery_rights_by_location_async', fishery_rights),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+
+    def _check(self):
+        return backend.identify_and_check_fish(b'image', '千葉県', latitude=LATITUDE, longitude=LONGITUDE)
+
+    def test_verdict_is_recomputed_on_cache_hit(self):
+        first = self._check()
+        self.assertTrue(first['isLegal'])
+        self.assertFalse(first['fromCache'])
+
+        # 漁業権が変わった後は、キャッシュした魚種で判定し直す
+        self.fishery_rights = {'hasFisheryRights': True, 'protectedSpecies': ['あわび'], 'restrictions': 'あわび'}
+        second = self._check()
+
+        self.assertFalse(second['isLegal'])
+        self.assertTrue(second['fromCache'])
+        self.assertEqual(self.gemini_calls, 1)
+        self.assertEqual(self.result_cache.stats()['stores'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+ウォームアップと準備完了（readiness）のテスト。
+外部APIの代わりにローカルのスタブサーバーへ WARMUP_URL_* を向けて、
+ウォームアップの前後で is_ready() と /ready の応答が切り替わることを確認する。
+"""
+import os
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from utils import warmup
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # APIキー無しのHEADと同じく401を返す（ウォームアップは応答のステータスを問わない）
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.send_response(401)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_server(handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def _gemini_ok():
+    return None
+
+
+async def _gemini_error():
+    raise RuntimeError('gemini unavailable')
+
+
+class WarmupReadinessTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = _start_server(_StubHandler)
+        stub_url = f'http://127.0.0.1:{cls.stub.server_address[1]}/'
+        cls.env = mock.patch.dict(os.environ, {
+            **{f'WARMUP_URL_{name.upper()}': stub_url for name in warmup.ENDPOINTS},
+            'WARMUP': '1',
+            'WARMUP_REQUIRED': '',
+            'GEMINI_PROBE': '1',
+        })
+        cls.env.start()
+        readiness = warmup.start_readiness_server(0, '127.0.0.1')
+        cls.ready_url = f'http://127.0.0.1:{readiness.server_address[1]}/ready'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.stub.shutdown()
+        cls.stub.server_close()
+
+    def setUp(self):
+        # ウォームアップ前の状態に戻す
+        with warmup._status_lock:
+            warmup._warmup_status.update(started=None, finished=None, timings={}, errors={}, dependencies={})
+
+    def _ready_status(self) -> int:
+        try:
+            with urllib.request.urlopen(self.ready_url, timeout=5) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def test_ready_after_warmup(self):
+        self.assertFalse(warmup.is_ready())
+        self.assertEqual(self._ready_status(), 503)
+
+        status = warmup.run_warmup(gemini_probe=_gemini_ok)
+
+        for name in warmup.ENDPOINTS:
+            self.assertTrue(status['dependencies'][name]['ok'], status['errors'])
+        self.assertTrue(warmup.is_ready())
+        self.assertEqual(self._ready_status(), 200)
+
+    def test_required_dependency_failure_keeps_not_ready(self):
+        with mock.patch.dict(os.environ, {'WARMUP_REQUIRED': 'gemini'}):
+            status = warmup.run_warmup(gemini_probe=_gemini_error)
+
+            self.assertTrue(status['done'])
+            self.assertFalse(status['dependencies']['gemini']['ok'])
+            self.assertFalse(warmup.is_ready())
+            self.assertEqual(self._ready_status(), 503)
+
+
+if __name__ == '__main__':
+    unittest.main()
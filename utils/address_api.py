@@ -0,0 +1,43 @@
+import json
+from typing import Dict, Optional
+
+from .http_client import request, request_async
+
+# HeartRails GeoAPI（逆ジオコーディング）
+HEARTRAILS_URL = "https://geoapi.heartrails.com/api/json"
+
+
+def _address_params(latitude: float, longitude: float) -> Dict:
+    return {
+        "method": "searchByGeoLocation",
+        "x": longitude,  # 経度
+        "y": latitude  # 緯度
+    }
+
+
+def _parse_address(data: Dict) -> Optional[Dict]:
+    # 最も近い住所を取得（海上などで見つからない場合はNone）
+    if "response" in data and "location" in data["response"]:
+        loc = data["response"]["location"][0]
+        return {
+            "prefecture": loc["prefecture"],
+            "city": loc["city"],
+            "town": loc["town"],
+            "address": f"{loc['prefecture']}{loc['city']}{loc['town']}",
+        }
+    return None
+
+
+def search_address_by_location(latitude: float, longitude: float) -> Optional[Dict]:
+    """
+    緯度経度から都道府県・市区町村・町域を取得する関数。
+    通信エラーの場合は例外を送出する。
+    """
+    response = request('heartrails', 'GET', HEARTRAILS_URL, params=_address_params(latitude, longitude))
+    return _parse_address(response.json())
+
+
+async def search_address_by_location_async(latitude: float, longitude: float) -> Optional[Dict]:
+    # search_address_by_location の非同期版
+    _, body = await request_async('heartrails', 'GET', HEARTRAILS_URL, params=_address_params(latitude, longitude))
+    return _parse_address(json.loads(body))
@@ -0,0 +1,40 @@
+import asyncio
+import threading
+from typing import Awaitable, TypeVar
+
+T = TypeVar('T')
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    プロセス全体で共有するイベントループを返す関数（専用スレッドで常に動かす）。
+    同期APIからの呼び出しはすべてこのループで実行するので、接続やクライアントを使い回せる。
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="uochecker-event-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro: Awaitable[T], timeout: float = None) -> T:
+    # 同期コードからコルーチンを共有ループで実行して結果を待つ
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result(timeout)
+
+
+async def run_on_background_loop(coro: Awaitable[T]) -> T:
+    """
+    コルーチンを共有ループで実行する関数。
+    ループに紐づくクライアント（GeminiのgRPC非同期クライアントなど）を使う処理はこれを通す。
+    """
+    loop = get_background_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
@@ -0,0 +1,41 @@
+"""
+APIキーの読み込み（Gemini・海しる）。
+環境変数（Hugging Faceのシークレット）を優先し、無ければキーファイルから読んで環境変数に設定する。
+importの時点では読まず、最初に必要になったとき（またはウォームアップ時）に1回だけ読む。
+"""
+import os
+import threading
+from pathlib import Path
+
+# 環境変数名 -> (キーファイル, 表示名)
+API_KEYS = {
+    'GEMINI_API_KEY_TXT': (Path('gemini_api_key.txt'), 'gemini_api_key'),
+    'OCP_API_KEY_TXT': (Path('ocp_api_key.txt'), 'ocp_api_key'),
+}
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def _read_key_file(path: Path) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip().split('\n')[0].strip()
+
+
+def load_api_keys() -> None:
+    global _loaded
+    if _loaded:
+        return
+
+    with _lock:
+        if _loaded:
+            return
+        for env_name, (path, label) in API_KEYS.items():
+            if os.environ.get(env_name):
+                print(f"{label} loaded from environment")
+            elif path.exists():
+                os.environ[env_name] = _read_key_file(path)
+                print(f"{path} found")
+            else:
+                print(f"{label} not found")
+        _loaded = True
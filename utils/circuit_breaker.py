@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from typing import Dict
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    外部APIの連続した失敗を検知して呼び出しを遮断するサーキットブレーカー。
+    closed: 通常どおり呼び出す。failure_threshold回続けて失敗（タイムアウト含む）するとopenになる。
+    open: reset_timeout秒の間は呼び出さずにすぐ失敗させる。
+    half_open: 試しに1件だけ呼び出し、成功すればclosed、失敗すれば再びopenに戻す。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'failures': 0,
+            'rejected': 0,
+            'opened': 0,
+        }
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self) -> bool:
+        """
+        呼び出してよいかを返す。Trueを返した場合は必ず record_success / record_failure / release のどれかを呼ぶこと。
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                self._stats['calls'] += 1
+                return True
+            if state == HALF_OPEN and not self._probing:
+                # 回復確認の呼び出しは1件だけ通す
+                self._probing = True
+                self._stats['calls'] += 1
+                print(f"サーキットブレーカー({self.name}): 回復確認の呼び出しを実行")
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CLOSED:
+                print(f"サーキットブレーカー({self.name}): 回復したため通常動作に戻します")
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._stats['failures'] += 1
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._state == CLOSED:
+                    self._stats['opened'] += 1
+                    print(f"⚠️ サーキットブレーカー({self.name}): {self._failures}回連続で失敗したため遮断します")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self) -> None:
+        # 成否が分からないまま中断された呼び出し（キャンセルなど）を取り消す
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self._current_state()
+            stats['consecutiveFailures'] = self._failures
+        return stats
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """
+    名前ごとにプロセス全体で共有するサーキットブレーカーを返す関数。
+    BREAKER_<名前>_FAILURES（連続失敗回数）と BREAKER_<名前>_RESET（遮断する秒数）で調整できる。
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                prefix = f'BREAKER_{name.upper()}'
+                breaker = CircuitBreaker(
+                    name,
+                    failure_threshold=int(os.environ.get(f'{prefix}_FAILURES', '5')),
+                    reset_timeout=float(os.environ.get(f'{prefix}_RESET', '30')),
+                )
+                _breakers[name] = breaker
+    return breaker
@@ -0,0 +1,239 @@
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import geohash
+
+DEFAULT_SEARCH_RADIUS = 3000
+
+
+def fishery_tile_for(latitude: float, longitude: float, radius: int = DEFAULT_SEARCH_RADIUS) -> str:
+    # 検索半径から決めた精度のジオハッシュタイル
+    return geohash.encode(latitude, longitude, geohash.precision_for_radius(radius))
+
+
+def tile_query_for(latitude: float, longitude: float, radius: int = DEFAULT_SEARCH_RADIUS) -> Tuple[str, float, float, int]:
+    """
+    座標が属するタイルと、そのタイルを代表する検索条件を返す関数。
+    タイル中心から「半径 + 中心から角までの距離」で検索するので、
+    タイル内のどの地点で検索した場合の結果も含む。
+    """
+    tile = fishery_tile_for(latitude, longitude, radius)
+    center_lat, center_lon, half_diagonal = geohash.tile_center(tile)
+    return tile, center_lat, center_lon, radius + int(math.ceil(half_diagonal))
+
+
+class FisheryTileCache:
+    """
+    共同漁業権APIの検索結果をジオハッシュタイル単位で保持するキャッシュ。
+    TTL内は新鮮なデータ、TTL切れでもstale期間内なら古いデータを返しつつ裏で再取得する。
+    件数上限を超えた場合は、最も長く使われていないタイルから捨てる（LRU）。
+    """
+
+    def __init__(self, ttl_seconds: float = 6 * 3600, stale_seconds: float = 7 * 24 * 3600,
+                 max_entries: int = 20000, db_path: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+
+        self._tiles = OrderedDict()  # key -> (取得時刻, features) 最近使った順
+        self._refreshing = set()
+        self._refresh_tasks = set()
+        self._lock = threading.Lock()
+        self._stats = {
+            'freshHits': 0,
+            'staleHits': 0,
+            'misses': 0,
+            'refreshes': 0,
+        }
+
+        self._db = None
+        if db_path:
+            try:
+                db_dir = os.path.dirname(db_path)
+                if db_dir:
+                    os.makedirs(db_dir, exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS tiles ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, fetched_at REAL NOT NULL)"
+                )
+                self._db.commit()
+                self._load_from_disk()
+            except sqlite3.Error as e:
+                print(f"⚠️ 漁業権キャッシュDBを開けません: {e}")
+                self._db = None
+
+    def lookup(self, key: str) -> Tuple[Optional[List[Dict]], str, Optional[float]]:
+        """
+        キャッシュを参照して (features, 状態, 取得時刻) を返す。状態は 'fresh' / 'stale' / 'miss'。
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is not None:
+                fetched_at, features = entry
+                age = now - fetched_at
+                if age <= self.ttl_seconds:
+                    self._tiles.move_to_end(key)
+                    self._stats['freshHits'] += 1
+                    return features, 'fresh', fetched_at
+                if age <= self.ttl_seconds + self.stale_seconds:
+                    self._tiles.move_to_end(key)
+                    self._stats['staleHits'] += 1
+                    return features, 'stale', fetched_at
+            self._stats['misses'] += 1
+            return None, 'miss', None
+
+    def last_known(self, key: str) -> Tuple[Optional[List[Dict]], Optional[float]]:
+        """
+        期限に関係なく、最後に取得できた (features, 取得時刻) を返す。
+        APIが使えない間の代替データとして使う。
+        """
+        with self._lock:
+            entry = self._tiles.get(key)
+        if entry is None:
+            return None, None
+        fetched_at, features = entry
+        return features, fetched_at
+
+    def get_or_fetch(self, key: str,
+                     fetch: Callable[[], Optional[List[Dict]]]) -> Tuple[Optional[List[Dict]], str, Optional[float]]:
+        """
+        キャッシュから検索結果を (features, 状態, 取得時刻) で返す。無い場合はfetchを呼んで保存する。
+        状態は lookup と同じで、staleの場合は古いデータを返しつつ裏で再取得する。
+        fetchがNone（APIエラー）を返した場合は保存せず (None, 'miss', None) を返す。
+        """
+        features, state, fetched_at = self.lookup(key)
+        if state == 'stale' and self._begin_refresh(key):
+            threading.Thread(
+                target=self._refresh, args=(key, fetch), name=f"fishery-refresh-{key}", daemon=True
+            ).start()
+        if state != 'miss':
+            return features, state, fetched_at
+
+        features = fetch()
+        if features is None:
+            return None, 'miss', None
+        return features, 'fresh', self.set(key, features)
+
+    async def get_or_fetch_async(self, key: str, fetch: Callable[[], Awaitable[Optional[List[Dict]]]]
+                                 ) -> Tuple[Optional[List[Dict]], str, Optional[float]]:
+        # get_or_fetch の非同期版。staleの再取得は実行中のループのタスクとして行う
+        features, state, fetched_at = self.lookup(key)
+        if state == 'stale' and self._begin_refresh(key):
+            task = asyncio.ensure_future(self._refresh_async(key, fetch))
+            self._refresh_tasks.add(task)
+            task.add_done_callback(self._refresh_tasks.discard)
+        if state != 'miss':
+            return features, state, fetched_at
+
+        features = await fetch()
+        if features is None:
+            return None, 'miss', None
+        # SQLiteへの書き込みはイベントループを止めないよう別スレッドで行う
+        return features, 'fresh', await asyncio.to_thread(self.set, key, features)
+
+    def set(self, key: str, features: List[Dict]) -> float:
+        # 保存して取得時刻を返す
+        now = time.time()
+        with self._lock:
+            self._tiles[key] = (now, features)
+            self._tiles.move_to_end(key)
+            # 最も長く使われていないタイルから捨てる
+            while len(self._tiles) > self.max_entries:
+                self._tiles.popitem(last=False)
+
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO tiles (key, value, fetched_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(features, ensure_ascii=False), now)
+                    )
+                    self._db.execute(
+                        "DELETE FROM tiles WHERE fetched_at < ?",
+                        (now - self.ttl_seconds - self.stale_seconds,)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ 漁業権キャッシュ書き込みエラー: {e}")
+        return now
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tiles'] = len(self._tiles)
+        return stats
+
+    def _begin_refresh(self, key: str) -> bool:
+        # 同じタイルの再取得は1つだけ走らせる
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self._stats['refreshes'] += 1
+            return True
+
+    def _end_refresh(self, key: str, features: Optional[List[Dict]]) -> None:
+        if features is not None:
+            self.set(key, features)
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def _refresh(self, key: str, fetch: Callable[[], Optional[List[Dict]]]) -> None:
+        features = None
+        try:
+            features = fetch()
+        finally:
+            self._end_refresh(key, features)
+
+    async def _refresh_async(self, key: str, fetch: Callable[[], Awaitable[Optional[List[Dict]]]]) -> None:
+        features = None
+        try:
+            features = await fetch()
+        finally:
+            if features is None:
+                self._end_refresh(key, features)
+            else:
+                # SQLiteへの書き込みを伴うので別スレッドで行う
+                await asyncio.to_thread(self._end_refresh, key, features)
+
+    def _load_from_disk(self) -> None:
+        cutoff = time.time() - self.ttl_seconds - self.stale_seconds
+        rows = self._db.execute(
+            "SELECT key, value, fetched_at FROM tiles WHERE fetched_at >= ? ORDER BY fetched_at DESC LIMIT ?",
+            (cutoff, self.max_entries)
+        ).fetchall()
+        # 取得時刻が古い順に入れて、古いタイルから捨てられるようにする
+        for key, value, fetched_at in reversed(rows):
+            self._tiles[key] = (fetched_at, json.loads(value))
+        print(f"漁業権キャッシュ: {len(rows)}タイルをディスクから読み込み")
+
+
+_tile_cache = None
+_tile_cache_lock = threading.Lock()
+
+
+def get_fishery_tile_cache() -> FisheryTileCache:
+    """
+    Streamlitの全セッションで共有する漁業権タイルキャッシュを返す関数。
+    FISHERY_CACHE_PATHを指定するとディスクにも保存して再起動後も使う。
+    """
+    global _tile_cache
+    if _tile_cache is None:
+        with _tile_cache_lock:
+            if _tile_cache is None:
+                _tile_cache = FisheryTileCache(
+                    ttl_seconds=float(os.environ.get('FISHERY_CACHE_TTL', str(6 * 3600))),
+                    stale_seconds=float(os.environ.get('FISHERY_CACHE_STALE', str(7 * 24 * 3600))),
+                    max_entries=int(os.environ.get('FISHERY_CACHE_MAX_TILES', '20000')),
+                    db_path=os.environ.get('FISHERY_CACHE_PATH') or None,
+                )
+    return _tile_cache
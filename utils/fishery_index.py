@@ -0,0 +1,176 @@
+import gzip
+import json
+import math
+import os
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .geohash import METERS_PER_DEGREE
+from .geometry import polygon_distances_m, ring_edges, rings_bbox, rings_to_arrays
+
+DEFAULT_SNAPSHOT_PATH = 'data/fishery_rights_snapshot.json.gz'
+
+
+class STRTree:
+    """
+    矩形（最小経度, 最小緯度, 最大経度, 最大緯度）の静的R木。
+    Sort-Tile-Recursiveで一括構築し、検索は各階層の矩形判定をNumPyでまとめて行う。
+    """
+
+    def __init__(self, boxes: np.ndarray, node_capacity: int = 16):
+        self.node_capacity = node_capacity
+        self.size = len(boxes)
+        # levels[0]が葉（各要素の矩形）、最後が根の階層
+        # 各階層は (ノードの矩形配列, 各ノードの子インデックス配列のリスト)
+        self.levels = []
+
+        bounds = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        children = [np.array([i]) for i in range(len(bounds))]
+        self.levels.append((bounds, children))
+        while len(bounds) > 1:
+            groups = self._pack(bounds)
+            bounds = np.array([
+                [bounds[g, 0].min(), bounds[g, 1].min(), bounds[g, 2].max(), bounds[g, 3].max()]
+                for g in groups
+            ])
+            self.levels.append((bounds, groups))
+
+    def _pack(self, bounds: np.ndarray) -> List[np.ndarray]:
+        # 中心のx座標で縦の帯に分け、各帯の中をy座標で並べてノード容量ごとに区切る
+        capacity = self.node_capacity
+        node_count = math.ceil(len(bounds) / capacity)
+        slice_count = math.ceil(math.sqrt(node_count))
+        slice_size = slice_count * capacity
+
+        center_x = (bounds[:, 0] + bounds[:, 2]) / 2
+        center_y = (bounds[:, 1] + bounds[:, 3]) / 2
+        order_x = np.argsort(center_x, kind='stable')
+
+        groups = []
+        for start in range(0, len(order_x), slice_size):
+            strip = order_x[start:start + slice_size]
+            strip = strip[np.argsort(center_y[strip], kind='stable')]
+            for node_start in range(0, len(strip), capacity):
+                groups.append(strip[node_start:node_start + capacity])
+        return groups
+
+    def query(self, min_x: float, min_y: float, max_x: float, max_y: float) -> np.ndarray:
+        """
+        検索矩形と交差する要素のインデックスを返す。
+        """
+        if self.size == 0:
+            return np.empty(0, dtype=np.int64)
+
+        candidates = np.arange(len(self.levels[-1][0]))
+        for level in range(len(self.levels) - 1, -1, -1):
+            bounds, children = self.levels[level]
+            box = bounds[candidates]
+            hit = candidates[
+                (box[:, 0] <= max_x) & (box[:, 2] >= min_x) &
+                (box[:, 1] <= max_y) & (box[:, 3] >= min_y)
+            ]
+            if level == 0 or len(hit) == 0:
+                return hit
+            candidates = np.concatenate([self.levels[level][1][i] for i in hit])
+        return candidates
+
+
+class FisheryIndex:
+    """
+    共同漁業権ポリゴンのローカル空間インデックス。
+    search は FisheryRightsAPI.search_by_location と同じ形の地物リストを距離順で返す（distanceに距離を付与）。
+    """
+
+    def __init__(self, features: List[Dict], version: str = None, synced_at: str = None):
+        self.version = version
+        self.synced_at = synced_at
+        self.attributes = []
+        self.edges = []
+
+        boxes = []
+        for feature in features:
+            rings = rings_to_arrays((feature.get('geometry') or {}).get('rings', []))
+            if not rings:
+                continue
+            self.attributes.append(feature.get('attributes', {}))
+            self.edges.append(ring_edges(rings))
+            boxes.append(rings_bbox(rings))
+
+        self.tree = STRTree(np.array(boxes, dtype=np.float64).reshape(-1, 4))
+
+    def __len__(self) -> int:
+        return len(self.attributes)
+
+    def search(self, latitude: float, longitude: float, radius: float) -> List[Dict]:
+        # 半径を度に換算した矩形で候補を絞り込み、正確な距離で判定する
+        d_lat = radius / METERS_PER_DEGREE
+        d_lon = d_lat / max(math.cos(math.radians(latitude)), 1e-6)
+        candidates = self.tree.query(longitude - d_lon, latitude - d_lat, longitude + d_lon, latitude + d_lat)
+
+        distances = polygon_distances_m([self.edges[i] for i in candidates], latitude, longitude)
+        order = np.argsort(distances, kind='stable')
+        return [
+            {'attributes': dict(self.attributes[candidates[j]]), 'distance': float(distances[j])}
+            for j in order if distances[j] <= radius
+        ]
+
+
+def load_snapshot(path: str = DEFAULT_SNAPSHOT_PATH) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_snapshot(snapshot: Dict, path: str = DEFAULT_SNAPSHOT_PATH) -> None:
+    # 書き込み途中のファイルを読まれないよう、一時ファイルに書いてから置き換える
+    snapshot_dir = os.path.dirname(path)
+    if snapshot_dir:
+        os.makedirs(snapshot_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def build_index(snapshot: Dict) -> FisheryIndex:
+    return FisheryIndex(
+        snapshot.get('features', []),
+        version=snapshot.get('version'),
+        synced_at=snapshot.get('syncedAt'),
+    )
+
+
+_local_index = None
+_local_index_loaded = False
+_local_index_lock = threading.Lock()
+
+
+def set_local_fishery_index(index: FisheryIndex) -> None:
+    # 参照の差し替えだけなので、検索中の読み手はブロックされず古いインデックスを使い切る
+    global _local_index, _local_index_loaded
+    with _local_index_lock:
+        _local_index = index
+        _local_index_loaded = True
+
+
+def get_local_fishery_index() -> Optional[FisheryIndex]:
+    """
+    スナップショットから構築したローカルインデックスを返す関数。
+    スナップショットが無い場合はNoneを返す。
+    """
+    global _local_index, _local_index_loaded
+    if not _local_index_loaded:
+        with _local_index_lock:
+            if not _local_index_loaded:
+                path = os.environ.get('FISHERY_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH)
+                snapshot = load_snapshot(path)
+                if snapshot is not None:
+                    _local_index = build_index(snapshot)
+                    print(f"漁業権ローカルインデックス: {len(_local_index)}件 (version {_local_index.version})")
+                else:
+                    print(f"⚠️ 漁業権スナップショットがありません: {path}")
+                _local_index_loaded = True
+    return _local_index
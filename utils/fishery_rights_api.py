@@ -1,79 +1,335 @@
-import requests
-from typing import Dict, Optional, List
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, Optional, List, Tuple
 import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .api_keys import load_api_keys
+from .circuit_breaker import get_circuit_breaker
+from .fishery_cache import DEFAULT_SEARCH_RADIUS, get_fishery_tile_cache, tile_query_for
+from .fishery_index import get_local_fishery_index
+from .geometry import polygon_distances_m, ring_edges, rings_to_arrays
+from .http_client import USER_AGENT, get_http_session, request, request_async
+from .singleflight import SingleFlight
+
+# 取得済みポリゴンの辺配列のキャッシュ（タイルキャッシュから同じ地物が何度も渡されるため）
+_edge_cache = OrderedDict()
+_edge_cache_lock = threading.Lock()
+_EDGE_CACHE_MAX = 5000
+
+# 同じタイルへの同時の問い合わせは1回にまとめる
+_tile_flight = SingleFlight('fishery-tile')
+
+
+def _feature_edges(feature: Dict) -> Optional[np.ndarray]:
+    rings = (feature.get('geometry') or {}).get('rings')
+    if not rings:
+        return None
+    first_ring = rings[0]
+    key = (
+        len(rings), sum(len(r) for r in rings),
+        tuple(first_ring[0]), tuple(first_ring[len(first_ring) // 2]),
+        feature.get('attributes', {}).get('第一種共同漁業権'),
+    )
+    with _edge_cache_lock:
+        edges = _edge_cache.get(key)
+        if edges is not None:
+            _edge_cache.move_to_end(key)
+            return edges
+
+    arrays = rings_to_arrays(rings)
+    if not arrays:
+        return None
+    edges = ring_edges(arrays)
+    with _edge_cache_lock:
+        _edge_cache[key] = edges
+        while len(_edge_cache) > _EDGE_CACHE_MAX:
+            _edge_cache.popitem(last=False)
+    return edges
+
+
+def rank_features(fishery_data: List[Dict], latitude: float, longitude: float,
+                  radius: float = DEFAULT_SEARCH_RADIUS) -> List[Tuple[Optional[float], Dict]]:
+    """
+    地物を地点からの距離が近い順に並べて (距離, 地物) のリストで返す関数。
+    ローカルインデックスの結果は付与済みの距離を使い、ジオメトリ付きの結果は全地物の距離を一括計算する。
+    距離が分からない場合は元の順番のまま距離Noneで返す（地点そのもので検索した結果にだけ使われる）。
+    """
+    if all('distance' in f for f in fishery_data):
+        return sorted(((f['distance'], f) for f in fishery_data), key=lambda item: item[0])
+
+    edge_sets = [_feature_edges(f) for f in fishery_data]
+    if any(e is None for e in edge_sets):
+        return [(None, f) for f in fishery_data]
+
+    distances = polygon_distances_m(edge_sets, latitude, longitude)
+    order = np.argsort(distances, kind='stable')
+    # タイル単位の検索は半径を広げているので、実際の地点からの半径で絞り込む
+    return [(float(distances[i]), fishery_data[i]) for i in order if distances[i] <= radius]
+
+
+def _has_geometry(fishery_data: List[Dict]) -> bool:
+    # すべての地物に距離計算用のポリゴンがあるか（無いとタイル単位の検索結果を実際の地点で絞り込めない）
+    return all('distance' in f or _feature_edges(f) is not None for f in fishery_data)
+
+
+def split_species(val: Optional[str]) -> List[str]:
+    # 全角「、」を半角「,」に置換して分割して前後の空白を削除し、空文字を除去してあいうえお順に並び替える
+    if not val or not val.strip():
+        return []
+    raw_species = val.replace('、', ',').split(',')
+    return sorted([s.strip() for s in raw_species if s.strip()])
 
 class FisheryRightsAPI:
     BASE_URL = "https://api.msil.go.jp/common-fishery-right2024/v2/MapServer/3/query"
 
-    def __init__(self):
+    def __init__(self, use_cache: bool = True, backend: str = None, nearest: bool = None):
+        # nearest: ジオメトリも取得して本当に最も近い漁業権を選ぶ
+        if nearest is None:
+            nearest = os.environ.get('FISHERY_NEAREST', '1') != '0'
+        self.nearest = nearest
+        # local: 同期済みスナップショットのローカルインデックスで検索する / remote: 海しるAPIに問い合わせる
+        self.backend = backend or os.environ.get('FISHERY_RIGHTS_BACKEND', 'remote')
+        # 検索結果はジオハッシュタイル単位（ジオメトリを取得しない場合は地点単位）でプロセス全体で共有する
+        self.cache = get_fishery_tile_cache() if use_cache else None
+        load_api_keys()
         api_key = os.environ.get('OCP_API_KEY_TXT')
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.headers = {
             'Accept': 'application/json',
-            'User-Agent': 'UOChecker/1.0',
-            'Ocp-Apim-Subscription-Key': api_key
-        })
+            'User-Agent': USER_AGENT,
+            'Ocp-Apim-Subscription-Key': api_key or ''
+        }
+        # 接続はプロセス全体で共有する（APIキーは他のホストに送らないようリクエストごとに渡す）
+        self.session = get_http_session()
+
+    def search_by_location(self, latitude: float, longitude: float, radius: int = DEFAULT_SEARCH_RADIUS) -> Optional[List[Dict]]:
+        return self.search_with_status(latitude, longitude, radius)[0]
+
+    def search_with_status(self, latitude: float, longitude: float,
+                           radius: int = DEFAULT_SEARCH_RADIUS) -> Tuple[Optional[List[Dict]], str, Optional[float]]:
+        """
+        (features, 状態, 取得時刻) を返す。状態は 'ok' / 'stale' / 'unavailable'。
+        APIが使えない場合はそのエリアで最後に取得できた結果を 'stale' として返す。
+        """
+        local_result = self._search_local(latitude, longitude, radius)
+        if local_result is not None:
+            return local_result, 'ok', None
+
+        if self.cache is None:
+            features = self._query(latitude, longitude, radius)
+            return features, 'ok' if features is not None else 'unavailable', None
+
+        # タイル中心から半径を広げて検索するのは、ジオメトリで実際の地点から絞り込める場合だけ
+        if self.nearest:
+            tile, center_lat, center_lon, tile_radius = tile_query_for(latitude, longitude, radius)
+            result = self._search_cached(self._cache_key(tile, radius), center_lat, center_lon, tile_radius)
+            if result[0] is None or _has_geometry(result[0]):
+                return result
+            print("⚠️ ジオメトリの無い漁業権があるため、タイルではなく地点で検索し直します")
+        return self._search_cached(self._point_key(latitude, longitude, radius), latitude, longitude, radius)
+
+    def _search_cached(self, key: str, latitude: float, longitude: float,
+                       radius: int) -> Tuple[Optional[List[Dict]], str, Optional[float]]:
+        features, state, fetched_at = self.cache.get_or_fetch(
+            key, lambda: _tile_flight.do_sync(key, lambda: self._query(latitude, longitude, radius))
+        )
+        return self._cached_result(key, features, state, fetched_at)
+
+    async def search_by_location_async(self, latitude: float, longitude: float,
+                                       radius: int = DEFAULT_SEARCH_RADIUS) -> Optional[List[Dict]]:
+        # search_by_location の非同期版（aiohttpで問い合わせる）
+        return (await self.search_with_status_async(latitude, longitude, radius))[0]
+
+    async def search_with_status_async(self, latitude: float, longitude: float,
+                                       radius: int = DEFAULT_SEARCH_RADIUS) -> Tuple[Optional[List[Dict]], str, Optional[float]]:
+        # search_with_status の非同期版
+        # ローカルインデックスの読み込み・構築と検索はイベントループを止めないよう別スレッドで行う
+        local_result = await asyncio.to_thread(self._search_local, latitude, longitude, radius)
+        if local_result is not None:
+            return local_result, 'ok', None
+
+        if self.cache is None:
+            features = await self._query_async(latitude, longitude, radius)
+            return features, 'ok' if features is not None else 'unavailable', None
+
+        if self.nearest:
+            tile, center_lat, center_lon, tile_radius = tile_query_for(latitude, longitude, radius)
+            result = await self._search_cached_async(self._cache_key(tile, radius), center_lat, center_lon, tile_radius)
+            # ポリゴンの辺配列の作成も重いので別スレッドで行う（作った配列はキャッシュされ、距離計算で使い回す）
+            if result[0] is None or await asyncio.to_thread(_has_geometry, result[0]):
+                return result
+            print("⚠️ ジオメトリの無い漁業権があるため、タイルではなく地点で検索し直します")
+        return await self._search_cached_async(self._point_key(latitude, longitude, radius), latitude, longitude, radius)
+
+    async def _search_cached_async(self, key: str, latitude: float, longitude: float,
+                                   radius: int) -> Tuple[Optional[List[Dict]], str, Optional[float]]:
+        features, state, fetched_at = await self.cache.get_or_fetch_async(
+            key, lambda: _tile_flight.do(key, lambda: self._query_async(latitude, longitude, radius))
+        )
+        return self._cached_result(key, features, state, fetched_at)
+
+    def _cached_result(self, key: str, features: Optional[List[Dict]], state: str,
+                       fetched_at: Optional[float]) -> Tuple[Optional[List[Dict]], str, Optional[float]]:
+        if features is None:
+            return self._last_known(key)
+        if state == 'stale':
+            # TTL切れのデータ（裏で再取得中、または遮断中で再取得できない）は古いデータとして扱う
+            print(f"⚠️ {datetime.fromtimestamp(fetched_at):%Y-%m-%d %H:%M} 時点の漁業権キャッシュを使用します（再取得待ち）")
+            return features, 'stale', fetched_at
+        return features, 'ok', None
 
-    def search_by_location(self, latitude: float, longitude: float, radius: int = 3000) -> Optional[List[Dict]]:
+    def _last_known(self, key: str) -> Tuple[Optional[List[Dict]], str, Optional[float]]:
+        features, fetched_at = self.cache.last_known(key)
+        if features is None:
+            print("⚠️ 共同漁業権APIが使えず、このエリアのキャッシュもありません")
+            return None, 'unavailable', None
+        print(f"⚠️ 共同漁業権APIが使えないため {datetime.fromtimestamp(fetched_at):%Y-%m-%d %H:%M} 時点のキャッシュを使用します")
+        return features, 'stale', fetched_at
+
+    def _search_local(self, latitude: float, longitude: float, radius: int) -> Optional[List[Dict]]:
+        if self.backend != 'local':
+            return None
+        from .fishery_sync import ensure_background_refresh
+        ensure_background_refresh()
+        index = get_local_fishery_index()
+        if index is not None:
+            return index.search(latitude, longitude, radius)
+        print("⚠️ ローカルインデックスが無いため共同漁業権APIを使用します")
+        return None
+
+    def _cache_key(self, tile: str, radius: int) -> str:
+        return f"{tile}:{radius}:{'geometry' if self.nearest else 'attributes'}"
+
+    def _point_key(self, latitude: float, longitude: float, radius: int) -> str:
+        # 半径を広げずに地点そのもので検索した結果のキー（約10m単位に丸める）
+        return f"{latitude:.4f},{longitude:.4f}:{radius}:{'geometry' if self.nearest else 'attributes'}"
+
+    def _query_params(self, latitude: float, longitude: float, radius: int) -> Dict:
+        # distance=経度,緯度,距離
+
+        params = {
+            'f': 'json',
+            'geometry': f"{longitude},{latitude}",  # 中心点
+            'geometryType': 'esriGeometryPoint',
+            'inSR': '4326',
+            'spatialRel': 'esriSpatialRelIntersects',
+            'distance': str(radius),
+            'units': 'esriSRUnit_Meter',
+            'outFields': '第一種共同漁業権',
+            'where': "第一種共同漁業権 IS NOT NULL AND 第一種共同漁業権 <> ' '",
+            'returnGeometry': 'false'
+        }
+        if self.nearest:
+            # 距離計算用にWGS84のポリゴンを取得する（約5m単位に簡略化して転送量を抑える）
+            params.update({
+                'returnGeometry': 'true',
+                'outSR': '4326',
+                'maxAllowableOffset': os.environ.get('FISHERY_GEOMETRY_OFFSET', '0.00005'),
+                'geometryPrecision': '6',
+            })
+        return params
+
+    def _query(self, latitude: float, longitude: float, radius: int) -> Optional[List[Dict]]:
+        # 海しるAPIが続けて失敗している間は問い合わせずにすぐNoneを返す
+        breaker = get_circuit_breaker('msil')
+        if not breaker.allow_request():
+            print("⚠️ 共同漁業権APIは遮断中のため問い合わせを省略します")
+            return None
         try:
-            # distance=経度,緯度,距離
-
-            params = {
-                'f': 'json',
-                'geometry': f"{longitude},{latitude}",  # 中心点
-                'geometryType': 'esriGeometryPoint',
-                'inSR': '4326',
-                'spatialRel': 'esriSpatialRelIntersects',
-                'distance': str(radius),
-                'units': 'esriSRUnit_Meter',
-                'outFields': '第一種共同漁業権',
-                'where': "第一種共同漁業権 IS NOT NULL AND 第一種共同漁業権 <> ' '",
-                'returnGeometry': 'false'
-            }
+            params = self._query_params(latitude, longitude, radius)
 
             print(f"共同漁業権API(v2)呼び出し: {longitude}, {latitude}")
-            response = self.session.get(self.BASE_URL, params=params, verify=False,timeout=10)
+            response = request('msil', 'GET', self.BASE_URL, params=params, headers=self.headers)
 
             if response.status_code == 200:
                 data = response.json()
                 features = data.get('features', [])
                 print(f"✅ 共同漁業権API: {len(features)}件の漁業権を発見")
+                breaker.record_success()
                 return features
             else:
                 print(f"⚠️ APIエラー: {response.status_code} {response.text}")
+                breaker.record_failure()
                 return None
         except Exception as e:
             print(f"⚠️ 例外発生: {e}")
+            breaker.record_failure()
             return None
 
-    def extract_fishery_info(self, fishery_data: List[Dict]) -> Dict:
+    async def _query_async(self, latitude: float, longitude: float, radius: int) -> Optional[List[Dict]]:
+        breaker = get_circuit_breaker('msil')
+        if not breaker.allow_request():
+            print("⚠️ 共同漁業権APIは遮断中のため問い合わせを省略します")
+            return None
+        try:
+            params = self._query_params(latitude, longitude, radius)
+
+            print(f"共同漁業権API(v2)非同期呼び出し: {longitude}, {latitude}")
+            status, body = await request_async('msil', 'GET', self.BASE_URL, params=params,
+                                               headers=self.headers)
+            if status == 200:
+                data = json.loads(body)
+                features = data.get('features', [])
+                print(f"✅ 共同漁業権API: {len(features)}件の漁業権を発見")
+                breaker.record_success()
+                return features
+            else:
+                print(f"⚠️ APIエラー: {status} {body.decode('utf-8', 'replace')}")
+                breaker.record_failure()
+                return None
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            print(f"⚠️ 例外発生: {e}")
+            breaker.record_failure()
+            return None
+
+    def extract_fishery_info(self, fishery_data: List[Dict], latitude: float = None, longitude: float = None,
+                             radius: int = DEFAULT_SEARCH_RADIUS, status: str = 'ok',
+                             fetched_at: Optional[float] = None) -> Dict:
         """
         APIから取得した周辺の漁業権データの最も近い情報から、
         第一種共同漁業権の保護魚種ををまとめる関数。
+        座標が渡された場合は地物を距離順に並べ、残りの漁業権も近い順に返す。
+        status / fetched_at は search_with_status の結果で、古いデータや取得失敗を結果に明示する。
         """
+        data_status = {
+            # APIが使えず、最後に取得できた古いデータで判定した
+            'stale': status == 'stale',
+            # 漁業権データを取得できなかった（「漁業権なし」とは区別する）
+            'available': status != 'unavailable',
+            'fetchedAt': datetime.fromtimestamp(fetched_at).isoformat() if fetched_at else None,
+        }
+
+        ranked = []
+        if fishery_data and latitude is not None and longitude is not None:
+            ranked = rank_features(fishery_data, latitude, longitude, radius)
+        elif fishery_data:
+            ranked = [(None, f) for f in fishery_data]
 
         # 漁業権データが見つけられなかった場合空データを返す
-        if not fishery_data:
+        if not ranked:
             return {
                 'hasFisheryRights': False,
                 'protectedSpecies': [],
                 'restrictions': '特になし',
-                'details': []
+                'details': [],
+                **data_status
             }
 
-        closest_feature = fishery_data[0]
+        closest_distance, closest_feature = ranked[0]
 
         # ArcGIS形式のデータ構造から属性情報を取得
         attr = closest_feature.get('attributes', {})
         # 第一種共同漁業権の項目を取得
         val = attr.get('第一種共同漁業権')
 
-        protected_species_list = []
-        if val and val.strip():
-            # 全角「、」を半角「,」に置換して分割して前後の空白を削除
-            raw_species = val.replace('、', ',').split(',')
-            # 空文字を除去してあいうえお順に並び替える
-            protected_species_list = sorted([s.strip() for s in raw_species if s.strip()])
+        protected_species_list = split_species(val)
 
         details = [{
             'species': val.strip() if val else "種別不明"
@@ -87,6 +343,16 @@ class FisheryRightsAPI:
         else:
             restrictions = "最も近い場所に漁業権はありますが、対象種が記載されていません。"
 
+        # 2番目以降に近い漁業権（距離順）
+        other_rights = []
+        for distance, feature in ranked[1:]:
+            other_val = feature.get('attributes', {}).get('第一種共同漁業権')
+            other_rights.append({
+                'species': other_val.strip() if other_val else "種別不明",
+                'protectedSpecies': split_species(other_val),
+                'distance': distance,
+            })
+
         return {
             # 保護されている魚種が1つ以上あれば「漁業権あり(True)」と判定
             'hasFisheryRights': len(protected_species_list) > 0,
@@ -95,11 +361,30 @@ class FisheryRightsAPI:
             # 画面表示用の日本語テキスト
             'restrictions': restrictions,
             # 詳細データ（1件分）
-            'details': details
+            'details': details,
+            # 最も近い漁業権までの距離（メートル、区域内なら0、不明ならNone）
+            'nearestDistance': closest_distance,
+            # その他の漁業権（近い順）
+            'otherRights': other_rights,
+            **data_status
         }
 
 
+def get_tile_flight_stats() -> Dict:
+    # 同じタイルへの問い合わせをまとめた回数
+    return _tile_flight.stats()
+
+
 def get_fishery_rights_by_location(latitude: float, longitude: float) -> Dict:
     api = FisheryRightsAPI()
-    fishery_data = api.search_by_location(latitude, longitude)
-    return api.extract_fishery_info(fishery_data)
\ No newline at end of file
+    fishery_data, status, fetched_at = api.search_with_status(latitude, longitude)
+    return api.extract_fishery_info(fishery_data, latitude, longitude, status=status, fetched_at=fetched_at)
+
+
+async def get_fishery_rights_by_location_async(latitude: float, longitude: float) -> Dict:
+    # APIキーの読み込み・タイルキャッシュの準備（ディスクからの読み込み）と、距離計算を伴う結果の整理は
+    # イベントループを止めないよう別スレッドで行う
+    api = await asyncio.to_thread(FisheryRightsAPI)
+    fishery_data, status, fetched_at = await api.search_with_status_async(latitude, longitude)
+    return await asyncio.to_thread(api.extract_fishery_info, fishery_data, latitude, longitude,
+                                   status=status, fetched_at=fetched_at)
\ No newline at end of file
@@ -0,0 +1,318 @@
+"""
+共同漁業権（海しる MapServer レイヤー3）のポリゴンを一括ダウンロードして
+ローカルスナップショットを作成するツール。
+初回以降は差分（追加・更新・削除された地物）だけを取得してスナップショットに反映する。
+編集日時の項目（FISHERY_EDIT_FIELD）が無い場合、更新は定期的な全件取得と地物のハッシュの比較で検出する。
+
+実行コマンド　python -m utils.fishery_sync [スナップショットのパス] [--full]
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from .api_keys import load_api_keys
+from .fishery_index import (DEFAULT_SNAPSHOT_PATH, build_index, get_local_fishery_index, load_snapshot,
+                            save_snapshot, set_local_fishery_index)
+from .fishery_rights_api import FisheryRightsAPI
+from .http_client import request
+
+FISHERY_WHERE = "第一種共同漁業権 IS NOT NULL AND 第一種共同漁業権 <> ' '"
+CHUNK_SIZE = 200
+
+
+def fetch_object_ids(api: FisheryRightsAPI, where: str = FISHERY_WHERE) -> Dict:
+    # 対象となる地物のOBJECTID一覧（IDのみなので件数上限にかからない）
+    params = {
+        'f': 'json',
+        'where': where,
+        'returnIdsOnly': 'true',
+    }
+    response = request('msil', 'GET', api.BASE_URL, params=params, headers=api.headers, timeout=60)
+    response.raise_for_status()
+    data = response.json()
+    return {
+        'objectIdField': data.get('objectIdFieldName', 'OBJECTID'),
+        'objectIds': sorted(data.get('objectIds') or []),
+    }
+
+
+def get_edit_field() -> Optional[str]:
+    # レイヤーに編集日時の項目がある場合に指定する（例: EditDate）
+    return os.environ.get('FISHERY_EDIT_FIELD') or None
+
+
+def get_full_refresh_interval() -> float:
+    # FISHERY_EDIT_FIELD が無い場合に全件を取得し直す間隔（秒、0で無効）
+    return float(os.environ.get('FISHERY_FULL_REFRESH_INTERVAL', str(7 * 24 * 3600)))
+
+
+def fetch_features(api: FisheryRightsAPI, object_id_field: str, object_ids: List[int]) -> List[Dict]:
+    """
+    OBJECTIDを指定して、ポリゴンと第一種共同漁業権の属性をまとめて取得する関数。
+    """
+    out_fields = [object_id_field, '第一種共同漁業権']
+    if get_edit_field():
+        out_fields.append(get_edit_field())
+
+    features = []
+    for start in range(0, len(object_ids), CHUNK_SIZE):
+        chunk = object_ids[start:start + CHUNK_SIZE]
+        params = {
+            'f': 'json',
+            'objectIds': ','.join(str(i) for i in chunk),
+            'outFields': ','.join(out_fields),
+            'returnGeometry': 'true',
+            'outSR': '4326',
+        }
+        response = request('msil', 'POST', api.BASE_URL, data=params, headers=api.headers, timeout=60)
+        response.raise_for_status()
+        data = response.json()
+        if 'error' in data:
+            raise RuntimeError(f"MapServer error: {data['error']}")
+        features.extend(data.get('features', []))
+        print(f"  {min(start + CHUNK_SIZE, len(object_ids))}/{len(object_ids)}件 取得")
+    return features
+
+
+def download_snapshot(api: FisheryRightsAPI = None) -> Dict:
+    api = api or FisheryRightsAPI(use_cache=False)
+    ids = fetch_object_ids(api)
+    print(f"共同漁業権: {len(ids['objectIds'])}件をダウンロードします")
+    features = fetch_features(api, ids['objectIdField'], ids['objectIds'])
+
+    synced_at = datetime.now(timezone.utc).isoformat()
+    return {
+        'version': synced_at,
+        'syncedAt': synced_at,
+        'fullSyncedAt': synced_at,
+        'objectIdField': ids['objectIdField'],
+        'features': features,
+    }
+
+
+def _max_edit_time(features: List[Dict], edit_field: str) -> Optional[int]:
+    values = [f.get('attributes', {}).get(edit_field) for f in features]
+    values = [v for v in values if isinstance(v, (int, float))]
+    return int(max(values)) if values else None
+
+
+def _feature_digest(feature: Dict) -> str:
+    # 属性とポリゴンのハッシュ（全件取得し直したときに、内容が変わった地物を見分ける）
+    content = {'attributes': feature.get('attributes'), 'geometry': feature.get('geometry')}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _full_refresh_due(snapshot: Dict) -> bool:
+    interval = get_full_refresh_interval()
+    if interval <= 0:
+        return False
+    full_synced_at = snapshot.get('fullSyncedAt')
+    if not full_synced_at:
+        return True
+    return time.time() - datetime.fromisoformat(full_synced_at).timestamp() >= interval
+
+
+def _full_refresh(snapshot: Dict, api: FisheryRightsAPI) -> Tuple[Dict, Dict]:
+    # 全件を取得し直し、OBJECTIDごとのハッシュの比較で追加・更新・削除を数える
+    object_id_field = snapshot.get('objectIdField', 'OBJECTID')
+    new_snapshot = download_snapshot(api)
+    current = {f['attributes'][object_id_field]: _feature_digest(f) for f in snapshot['features']
+               if object_id_field in f.get('attributes', {})}
+    remote = {f['attributes'][new_snapshot['objectIdField']]: _feature_digest(f) for f in new_snapshot['features']
+              if new_snapshot['objectIdField'] in f.get('attributes', {})}
+    counts = {
+        'added': len(remote.keys() - current.keys()),
+        'updated': sum(1 for i in remote.keys() & current.keys() if remote[i] != current[i]),
+        'removed': len(current.keys() - remote.keys()),
+    }
+    if not any(counts.values()):
+        # 内容が同じならバージョンを変えず、インデックスを作り直さない
+        now = new_snapshot['syncedAt']
+        return dict(snapshot, syncedAt=now, fullSyncedAt=now), counts
+    return new_snapshot, counts
+
+
+def refresh_snapshot(snapshot: Optional[Dict], api: FisheryRightsAPI = None) -> Tuple[Dict, Dict]:
+    """
+    スナップショットに差分だけを反映する関数。
+    OBJECTID一覧の比較で追加・削除を、編集日時の項目（FISHERY_EDIT_FIELD）で更新を検出する。
+    FISHERY_EDIT_FIELD が無い場合は FISHERY_FULL_REFRESH_INTERVAL ごとに全件を取得し直し、
+    属性とポリゴンのハッシュの比較で更新を検出する。
+    戻り値は (新しいスナップショット, 差分件数)。
+    """
+    if not snapshot or not snapshot.get('features'):
+        new_snapshot = download_snapshot(api)
+        return new_snapshot, {'added': len(new_snapshot['features']), 'updated': 0, 'removed': 0}
+
+    api = api or FisheryRightsAPI(use_cache=False)
+    edit_field = get_edit_field()
+    if not edit_field:
+        if _full_refresh_due(snapshot):
+            print("FISHERY_EDIT_FIELD が未設定のため、全件を取得し直して更新を検出します")
+            return _full_refresh(snapshot, api)
+        if get_full_refresh_interval() > 0:
+            print("⚠️ FISHERY_EDIT_FIELD が未設定のため、差分更新では追加・削除だけを検出します"
+                  "（内容の更新は FISHERY_FULL_REFRESH_INTERVAL ごとの全件取得で反映します）")
+        else:
+            print("⚠️ FISHERY_EDIT_FIELD が未設定で全件取得も無効のため、内容が更新された漁業権は反映されません")
+    object_id_field = snapshot.get('objectIdField', 'OBJECTID')
+    current = {f['attributes'][object_id_field]: f for f in snapshot['features']
+               if object_id_field in f.get('attributes', {})}
+
+    remote_ids = set(fetch_object_ids(api)['objectIds'])
+    added = sorted(remote_ids - current.keys())
+    removed = sorted(current.keys() - remote_ids)
+
+    updated = []
+    if edit_field:
+        last_edit = _max_edit_time(snapshot['features'], edit_field)
+        if last_edit is not None:
+            last_edit_text = datetime.fromtimestamp(last_edit / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            where = f"({FISHERY_WHERE}) AND {edit_field} > timestamp '{last_edit_text}'"
+            updated = sorted(set(fetch_object_ids(api, where)['objectIds']) & current.keys())
+
+    now = datetime.now(timezone.utc).isoformat()
+    counts = {'added': len(added), 'updated': len(updated), 'removed': len(removed)}
+    if not (added or updated or removed):
+        return dict(snapshot, syncedAt=now), counts
+
+    for object_id in removed:
+        del current[object_id]
+    for feature in fetch_features(api, object_id_field, added + updated):
+        current[feature['attributes'][object_id_field]] = feature
+
+    new_snapshot = {
+        'version': now,
+        'syncedAt': now,
+        'fullSyncedAt': snapshot.get('fullSyncedAt'),
+        'objectIdField': object_id_field,
+        'features': [current[i] for i in sorted(current)],
+    }
+    return new_snapshot, counts
+
+
+class SnapshotRefresher:
+    """
+    ローカルスナップショットを定期的に差分更新するバックグラウンドスレッド。
+    新しいインデックスは裏で構築してから参照を差し替えるので、検索はブロックされない。
+    """
+
+    def __init__(self, path: str, interval_seconds: float):
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self.last_attempt = None
+        self.last_success = None
+        self.last_error = None
+        self.last_counts = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fishery-snapshot-refresher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def refresh_once(self) -> None:
+        self.last_attempt = time.time()
+        try:
+            snapshot = load_snapshot(self.path)
+            new_snapshot, counts = refresh_snapshot(snapshot)
+            self.last_counts = counts
+            if snapshot is None or new_snapshot.get('version') != snapshot.get('version'):
+                index = build_index(new_snapshot)
+                save_snapshot(new_snapshot, self.path)
+                set_local_fishery_index(index)
+                print(f"✅ 漁業権スナップショット更新: {counts} (version {index.version})")
+            else:
+                save_snapshot(new_snapshot, self.path)
+                index = get_local_fishery_index()
+                if index is not None:
+                    index.synced_at = new_snapshot['syncedAt']
+            self.last_success = time.time()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️ 漁業権スナップショット更新失敗: {e}")
+
+    def _run(self) -> None:
+        # スナップショットが無い、または古い場合は起動直後に更新する
+        status = get_snapshot_status()
+        if status['ageSeconds'] is None or status['ageSeconds'] >= self.interval_seconds:
+            self.refresh_once()
+        while not self._stop.wait(self.interval_seconds):
+            self.refresh_once()
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def ensure_background_refresh() -> Optional[SnapshotRefresher]:
+    """
+    バックグラウンド更新をプロセスで1回だけ開始する関数。
+    FISHERY_REFRESH_INTERVAL（秒）を0にすると無効。
+    """
+    global _refresher
+    interval = float(os.environ.get('FISHERY_REFRESH_INTERVAL', str(24 * 3600)))
+    if interval <= 0:
+        return None
+    if _refresher is None:
+        with _refresher_lock:
+            if _refresher is None:
+                path = os.environ.get('FISHERY_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH)
+                _refresher = SnapshotRefresher(path, interval)
+                _refresher.start()
+    return _refresher
+
+
+def get_snapshot_status() -> Dict:
+    """
+    ローカルスナップショットのバージョンと経過時間を返す関数。古さの監視に使う。
+    """
+    index = get_local_fishery_index()
+    age = None
+    if index is not None and index.synced_at:
+        age = time.time() - datetime.fromisoformat(index.synced_at).timestamp()
+
+    status = {
+        'version': index.version if index is not None else None,
+        'syncedAt': index.synced_at if index is not None else None,
+        'ageSeconds': age,
+        'features': len(index) if index is not None else 0,
+    }
+    if _refresher is not None:
+        status.update({
+            'lastRefreshAttempt': _refresher.last_attempt,
+            'lastRefreshSuccess': _refresher.last_success,
+            'lastRefreshError': _refresher.last_error,
+            'lastRefreshCounts': _refresher.last_counts,
+        })
+    return status
+
+
+def main() -> int:
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    path = args[0] if args else os.environ.get('FISHERY_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH)
+    load_api_keys()
+    try:
+        snapshot = None if '--full' in sys.argv else load_snapshot(path)
+        snapshot, counts = refresh_snapshot(snapshot)
+        print(f"差分: {counts}")
+    except Exception as e:
+        print(f"⚠️ ダウンロード失敗: {e}")
+        return 1
+
+    index = build_index(snapshot)
+    save_snapshot(snapshot, path)
+    print(f"✅ {len(index)}件のポリゴンを保存しました: {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,59 @@
 # utils/gemini_api.py
 
+import asyncio
+import concurrent.futures
 import os
 import json
-import google.generativeai as genai
+import threading
+import time
+from datetime import timedelta
 from typing import Dict
-from .fishery_rights_api import get_fishery_rights_by_location
+from .aio import get_background_loop, run_on_background_loop, run_sync
+from .api_keys import load_api_keys
+from .fishery_rights_api import get_fishery_rights_by_location_async
+from .hedging import HedgeStats, hedged_call
+from .image_encoder import image_mime_type
+from .image_hash import compute_dhash, get_near_duplicate_index
+from .lazy_import import lazy_module
+from .rate_limiter import AdmissionRejected, get_gemini_admission
+from .result_cache import get_result_cache, make_cache_key
+from .singleflight import SingleFlight
+from .species_matcher import match_protected_species
+
+# google.generativeai は読み込みに1秒近くかかるので、最初の識別（またはウォームアップ）まで読み込まない
+genai = lazy_module('google.generativeai')
+google_exceptions = lazy_module('google.api_core.exceptions')
+
+GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-3-flash-preview')
+# ヘッジ（2つ目のリクエスト）に使うモデル。未指定ならGEMINI_MODELと同じ
+GEMINI_FALLBACK_MODEL = os.environ.get('GEMINI_FALLBACK_MODEL') or None
+# 1回の識別で使うトークン数の見積もり（画像＋指示文＋出力）。実際の使用量は応答後に精算する
+GEMINI_TOKENS_PER_REQUEST = int(os.environ.get('GEMINI_TOKENS_PER_REQUEST', '3000'))
+# クォータエラーの応答に待ち時間が無い場合に送信を止める秒数
+GEMINI_QUOTA_BACKOFF = float(os.environ.get('GEMINI_QUOTA_BACKOFF', '10'))
+
+# APIキーの設定とモデルはプロセスで1回だけ作って使い回す
+_client_lock = threading.Lock()
+_client_configured = False
+_models_lock = threading.Lock()
+_models = {}  # モデル名 -> (GenerativeModel, 作り直す時刻)
 
 
 def get_gemini_client():
+    global _client_configured
+    if _client_configured:
+        return
+
+    with _client_lock:
+        if _client_configured:
+            return
+        _configure_gemini_client()
+        _client_configured = True
+
+
+def _configure_gemini_client():
     try:
+        load_api_keys()
         api_key = None
 
         if 'GEMINI_API_KEY_TXT' in os.environ:
@@ -29,33 +74,12 @@ def get_gemini_client():
         raise
 
 
-def identify_and_analyze_fish(image_bytes: bytes, prefecture: str, city: str = None, latitude: float = None,
-longitude: float = None) -> Dict:
-    get_gemini_client()
-    location = f"{city}, {prefecture}" if city else prefecture
-
-    print("Getting fishery rights data...")
-    fishery_rights_data = get_fishery_rights_by_location(latitude, longitude) if latitude and longitude else {
-        'hasFisheryRights': False,
-        'protectedSpecies': [],
-        'restrictions': 'None',
-        'details': []
-    }
-
-    has_fishing_rights = fishery_rights_data.get('hasFisheryRights', False)
-    protected_species = fishery_rights_data.get('protectedSpecies', [])
-    restrictions = fishery_rights_data.get('restrictions', 'None')
-
-    print(f"Fishing rights: {has_fishing_rights}")
-    print(f"Protected species: {protected_species}")
-    print(f"Restrictions: {restrictions}")
-    protected_species_str = ", ".join(protected_species)
-    prompt = f"""
+SPECIES_PROMPT = """
         # Advanced Fish Identification & Safety Analysis Prompt
 
     ## Background
     You are a world-renowned Ichthyologist and a specialist in Food Safety.
-    Your task is to analyze an input image, identify the species with high precision, and determine safety/legal status.
+    Your task is to analyze an input image, identify the species with high precision, and determine safety status.
     **You excel at distinguishing look-alike species by analyzing body shape and specific color markers.**
 
     ## Instructions
@@ -86,81 +110,252 @@ longitude: float = None) -> Dict:
             -   **Rule**: If the species is a known vector for Ciguatera, TTX, or Wax Esters, set `isPoisonous` to `true` (Warning), even if edible.
             -   **Decision**: Does *[Identified Species]* carry a risk of Ciguatera or TTX? -> **YES** = `true`.
 
-    4.  **Regulatory Check (Strict List Semantic Matching)**:
-        -   **Reference List**: [{protected_species_str}]
-        -   **Logic**: Check if the identified species is included in the **Reference List**.
-        -   **Semantic/Fuzzy Matching Rule (CRITICAL)**:
-            -   You must match not only exact strings but also **synonyms, broader categories, and variations**.
-            -   *Example A*: If List has "Tai" (Sea Bream) and Image is "Madai" (Red Sea Bream) -> **MATCH (true)**.
-            -   *Example B*: If List has "Maguro" (Tuna) and Image is "Kuro-maguro" (Bluefin Tuna) -> **MATCH (true)**.
-            -   *Example C*: If List has "Fugu" and Image is "Kusa-fugu" -> **MATCH (true)**.
-        -   **Decision**:
-            -   **IF MATCH FOUND (Semantically)**: Set `isRestricted: true`.
-            -   **IF NO MATCH**: Set `isRestricted: false`. (Ignore global Red Lists like IUCN if not in the Reference List).
-
-    5.  **Formatting**: Output the result strictly as a valid JSON object matching the defined schema.
+    4.  **Formatting**: Output the result strictly as a valid JSON object matching the defined schema.
 
     ## Parameters
     -   **Geographic Context**: Japanese waters.
     -   **Toxicity Threshold**: Risk-Based.
-    -   **Restricted Logic**: **Strictly based on the provided list only**, but allowing semantic matches.
     -   **Output Language**: As per JSON keys.
 
     ## Output Format
     ```json
-    {{
+    {
       "fishNameJa": "String",
       "fishNameHira": "String",
       "fishNameEn": "String",
       "scientificName": "String",
       "isEdible": true,
-      "isPoisonous": false,
-      "isRestricted": false
-    }}
+      "isPoisonous": false
+    }
     """
 
-    safety_settings = {
-        "HARM_CATEGORY_HARASSMENT": "BLOCK_NONE",
-        "HARM_CATEGORY_HATE_SPEECH": "BLOCK_NONE",
-        "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE",
-        "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_NONE",
-    }
-    try:
-        print(f"Sending to Gemini API: {location}")
 
-        model = genai.GenerativeModel("gemini-3-flash-preview")
+SAFETY_SETTINGS = {
+    "HARM_CATEGORY_HARASSMENT": "BLOCK_NONE",
+    "HARM_CATEGORY_HATE_SPEECH": "BLOCK_NONE",
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE",
+    "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_NONE",
+}
+
+def _generation_config():
+    return genai.types.GenerationConfig(response_mime_type="application/json")
+
+
+def get_species_model(model_name: str = None) -> 'genai.GenerativeModel':
+    """
+    魚種識別用のモデルを返す関数。
+    固定の指示文はサーバー側のコンテキストキャッシュに載せ、リクエストでは画像だけを送る。
+    """
+    get_gemini_client()
+    model_name = model_name or GEMINI_MODEL
+
+    entry = _models.get(model_name)
+    if entry is not None and entry[1] > time.time():
+        return entry[0]
+
+    with _models_lock:
+        entry = _models.get(model_name)
+        if entry is None or entry[1] <= time.time():
+            entry = _create_species_model(model_name)
+            _models[model_name] = entry
+        return entry[0]
 
-        response = model.generate_content(
-            contents=[
-                prompt,{
-            "mime_type": "image/jpeg",
-            "data": image_bytes
-            }
-                ],
-            generation_config=genai.types.GenerationConfig(response_mime_type="application/json"),
-            safety_settings = safety_settings
-        )
 
+def _create_species_model(model_name: str):
+    if os.environ.get('GEMINI_CONTEXT_CACHE', '1') != '0':
+        ttl_seconds = int(os.environ.get('GEMINI_CONTEXT_CACHE_TTL', '3600'))
         try:
-            data = json.loads(response.text)
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error: {e}")
-            return {
-                "success": False,
-                "isLegal": False,
-                "message": "Failed to identify fish"
-            }
+            cached_content = genai.caching.CachedContent.create(
+                model=f"models/{model_name}",
+                display_name="uochecker-species-prompt",
+                system_instruction=SPECIES_PROMPT,
+                ttl=timedelta(seconds=ttl_seconds),
+            )
+            model = genai.GenerativeModel.from_cached_content(
+                cached_content,
+                generation_config=_generation_config(),
+                safety_settings=SAFETY_SETTINGS,
+            )
+            print(f"Gemini context cache created: {cached_content.name}")
+            # キャッシュの期限切れ前にモデルを作り直す
+            return model, time.time() + max(ttl_seconds - 60, 60)
+        except Exception as e:
+            # 指示文がキャッシュの最小トークン数に満たない場合などはシステム指示で送る
+            print(f"Gemini context cache unavailable: {e}")
+
+    model = genai.GenerativeModel(
+        model_name,
+        system_instruction=SPECIES_PROMPT,
+        generation_config=_generation_config(),
+        safety_settings=SAFETY_SETTINGS,
+    )
+    # キャッシュを作れなかった場合も1時間ごとに作成を試し直す
+    return model, time.time() + 3600
+
+
+async def probe_gemini() -> None:
+    """
+    起動時のウォームアップ用にGeminiへの接続を確立しておく関数。
+    クライアントの設定とモデル（コンテキストキャッシュ）の作成を済ませ、識別と同じ共有ループの非同期クライアントで
+    トークン数の計算（生成より軽く、料金もかからない）を1回呼び出す。
+    """
+    await asyncio.to_thread(get_species_model)
+    probe = genai.GenerativeModel(GEMINI_MODEL)
+    await run_on_background_loop(probe.count_tokens_async("ping"))
+
+
+async def _generate_species_json(image_bytes: bytes, model_name: str = None, wait: bool = True,
+                                 admitted: bool = False, priority: int = 0) -> str:
+    """
+    Geminiで魚種を識別してJSON文字列を返す関数。
+    送信前にクォータ（RPM/TPM）の受付制御を通し、混雑時は AdmissionRejected を送出する。
+    wait=False の場合は待ち行列に並ばず、空きが無ければすぐ断る（ヘッジ用）。
+    admitted=True は呼び出し元で受付済みの場合。priorityは待ち行列の優先度（小さいほど先）。
+    """
+    admission = get_gemini_admission()
+    if not admitted:
+        await admission.acquire(GEMINI_TOKENS_PER_REQUEST, priority=priority, wait=wait)
+
+    # GeminiのgRPC非同期クライアントはループに紐づくため、共有ループで実行する
+    model = await asyncio.to_thread(get_species_model, model_name)
+    try:
+        response = await model.generate_content_async(
+            contents=[{
+                "mime_type": image_mime_type(image_bytes),
+                "data": image_bytes
+            }]
+        )
+    except google_exceptions.ResourceExhausted as e:
+        # クォータを超えた場合は送信を止め、利用者には混雑中として返す
+        print(f"Gemini quota exceeded: {e}")
+        admission.pause(GEMINI_QUOTA_BACKOFF)
+        raise AdmissionRejected(GEMINI_QUOTA_BACKOFF, reason='quota') from e
+
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None and getattr(usage, 'total_token_count', 0):
+        admission.settle(GEMINI_TOKENS_PER_REQUEST, usage.total_token_count)
+    return response.text
+
+
+def _hedging_enabled() -> bool:
+    return os.environ.get('GEMINI_HEDGE', '0') == '1'
+
+
+_hedge_stats = HedgeStats(
+    percentile=float(os.environ.get('GEMINI_HEDGE_PERCENTILE', '95')),
+    default_delay=float(os.environ.get('GEMINI_HEDGE_DELAY', '4.0')),
+    min_delay=float(os.environ.get('GEMINI_HEDGE_MIN_DELAY', '0.5')),
+)
+
+
+# 同じ画像の同時の識別は1回にまとめる
+_species_flight = SingleFlight('species')
+
+
+def get_species_flight_stats() -> Dict:
+    # 同じ画像の識別をまとめた回数
+    return _species_flight.stats()
+
+
+def get_admission_stats() -> Dict:
+    # Gemini呼び出しの受付・待ち行列・クォータエラーの回数
+    return get_gemini_admission().stats()
+
+
+def get_hedge_stats() -> Dict:
+    # ヘッジの発生率・勝った側・レイテンシ分布（ヘッジの期限の調整用）
+    return _hedge_stats.stats()
+
+
+def _is_valid_species_json(text: str) -> bool:
+    try:
+        return isinstance(json.loads(text), dict)
+    except (TypeError, json.JSONDecodeError):
+        return False
+
+
+async def _generate_species_json_hedged(image_bytes: bytes, priority: int = 0) -> str:
+    """
+    GEMINI_HEDGE=1 の場合、1回目のリクエストが応答時間のパーセンタイル（GEMINI_HEDGE_PERCENTILE）を
+    過ぎても返らなければ2つ目のリクエストを送り、先に返った有効なJSONを使う。
+    """
+    if not _hedging_enabled():
+        return await _generate_species_json(image_bytes, priority=priority)
+    # 待ち行列で待った時間をヘッジの期限に含めないよう、受付を済ませてから計測を始める
+    await get_gemini_admission().acquire(GEMINI_TOKENS_PER_REQUEST, priority=priority)
+    return await hedged_call(
+        lambda: _generate_species_json(image_bytes, admitted=True),
+        # ヘッジのためにクォータを超えないよう、空きが無ければヘッジは送らない
+        lambda: _generate_species_json(image_bytes, GEMINI_FALLBACK_MODEL, wait=False),
+        _hedge_stats,
+        _is_valid_species_json,
+    )
 
-        fish_name_ja = data.get('fishNameJa', '')
-        fish_name_hira = data.get('fishNameHira', '')
-        fish_name_en = data.get('fishNameEn', '')
-        scientific_name = data.get('scientificName', '')
-        is_edible = data.get('isEdible', True)
-        is_poisonous = data.get('isPoisonous', False)
 
-        is_protected = data.get('isRestricted', False)
+def identify_species(image_bytes: bytes) -> Dict:
+    return run_sync(identify_species_async(image_bytes))
 
-        if not fish_name_hira:
+
+async def identify_species_async(image_bytes: bytes, priority: int = 0) -> Dict:
+    """
+    画像から魚種を識別する関数（位置情報に依存しない）。
+    識別済みの画像は結果キャッシュから返し、同じ画像の識別が実行中ならその結果を待ち、
+    撮り直しなどの類似画像は識別済みの結果を再利用する。
+    """
+    key = await asyncio.to_thread(make_cache_key, image_bytes)
+    result = await _species_flight.do(key, lambda: _identify_species_cached(key, image_bytes, priority))
+    return dict(result)
+
+
+async def _identify_species_cached(key: str, image_bytes: bytes, priority: int = 0) -> Dict:
+    # SQLiteの読み書きはイベントループを止めないよう別スレッドで行う
+    cached = await asyncio.to_thread(lambda: get_result_cache().get(key))
+    if cached is not None:
+        print(f"キャッシュヒット: {cached.get('fishNameJa', '不明')}")
+        return dict(cached, fromCache=True)
+
+    species = await _identify_species(image_bytes, priority)
+    if species.get('success'):
+        await asyncio.to_thread(get_result_cache().set, key, species)
+    return species
+
+
+def _lookup_near_duplicate(near_duplicate_index, image_bytes: bytes):
+    # 画像のデコード・dHashの計算・BK木の検索はイベントループを止めないよう別スレッドで行う
+    image_hash = compute_dhash(image_bytes)
+    return image_hash, near_duplicate_index.lookup(image_hash)
+
+
+async def _identify_species(image_bytes: bytes, priority: int = 0) -> Dict:
+    near_duplicate_index = get_near_duplicate_index()
+    image_hash = None
+    data = None
+    try:
+        image_hash, data = await asyncio.to_thread(_lookup_near_duplicate, near_duplicate_index, image_bytes)
+    except Exception as e:
+        print(f"Image hash error: {e}")
+
+    # Geminiで識別した結果だけをインデックスに加える（再利用した結果を加えると、似た画像の間で識別結果が連鎖的に広がる）
+    from_gemini = data is None
+    try:
+        if from_gemini:
+            print("Sending to Gemini API")
+
+            response_text = await run_on_background_loop(_generate_species_json_hedged(image_bytes, priority))
+
+            try:
+                data = json.loads(response_text)
+            except json.JSONDecodeError as e:
+                print(f"JSON parse error: {e}")
+                return {
+                    "success": False,
+                    "isLegal": False,
+                    "message": "Failed to identify fish"
+                }
+        else:
+            print("Reusing identification of a near-duplicate image")
+
+        if not data.get('fishNameHira', ''):
             print("No fish name found")
             return {
                 "success": False,
@@ -168,33 +363,29 @@ longitude: float = None) -> Dict:
                 "message": "Failed to identify fish"
             }
 
-        print(f"Identified fish: {fish_name_ja} ({fish_name_en})")
-        print(f"Poisonous: {is_poisonous}")
+        if from_gemini and image_hash is not None:
+            await asyncio.to_thread(near_duplicate_index.add, image_hash, data)
 
-        if has_fishing_rights and is_protected:
-            print(f"ILLEGAL: Fishing rights exist in this area")
-            return {
-                "success": False,
-                "isLegal": False,
-                "fishNameJa": fish_name_ja,
-                "fishNameEn": fish_name_en,
-                "scientificName": scientific_name,
-                "isEdible": is_edible,
-                "isPoisonous": is_poisonous,
-                "gyogyoken": restrictions,
-                "message": f"Fishing rights area. Taking home prohibited."
-            }
-        else:
-            print(f"LEGAL: No fishing rights in this area")
-            return {
-                "success": True,
-                "isLegal": True,
-                "fishNameJa": fish_name_ja,
-                "fishNameEn": fish_name_en,
-                "scientificName": scientific_name,
-                "isEdible": is_edible,
-                "isPoisonous": is_poisonous,
-            }
+        return {
+            "success": True,
+            "fishNameJa": data.get('fishNameJa', ''),
+            "fishNameHira": data.get('fishNameHira', ''),
+            "fishNameEn": data.get('fishNameEn', ''),
+            "scientificName": data.get('scientificName', ''),
+            "isEdible": data.get('isEdible', True),
+            "isPoisonous": data.get('isPoisonous', False),
+        }
+
+    except AdmissionRejected as e:
+        print(f"Gemini busy ({e.reason}): retry after {e.retry_after:.0f}s")
+        return {
+            "success": False,
+            "isLegal": False,
+            "busy": True,
+            "retryAfter": e.retry_after,
+            "queueLength": e.position,
+            "message": f"混雑しています。{e.retry_after:.0f}秒ほど待ってからもう一度お試しください。"
+        }
 
     except Exception as e:
         print(f"Error: {e}")
@@ -204,4 +395,136 @@ longitude: float = None) -> Dict:
             "success": False,
             "isLegal": False,
             "message": "Error occurred during processing"
-        }
\ No newline at end of file
+        }
+
+
+def identify_and_analyze_fish(image_bytes: bytes, prefecture: str, city: str = None, latitude: float = None,
+longitude: float = None, species_job: concurrent.futures.Future = None) -> Dict:
+    return run_sync(identify_and_analyze_fish_async(image_bytes, prefecture, city, latitude, longitude, species_job))
+
+
+# 投機的な識別は、ボタンを押した後の識別より後回しにする
+SPECULATIVE_PRIORITY = 1
+
+
+def start_species_identification(image_bytes: bytes) -> concurrent.futures.Future:
+    """
+    位置に依存しない魚種識別だけを共有ループで先に始める関数（投機実行）。
+    返したFutureを identify_and_analyze_fish の species_job に渡すと、残りの漁業権検索と照合だけを待てばよい。
+    使わなくなった場合は cancel() すると、他に待っている呼び出しが無ければGeminiへの問い合わせも止める。
+    """
+    return asyncio.run_coroutine_threadsafe(
+        identify_species_async(image_bytes, priority=SPECULATIVE_PRIORITY), get_background_loop()
+    )
+
+
+async def _await_species(image_bytes: bytes, species_job: concurrent.futures.Future = None) -> Dict:
+    # 投機実行の結果が使えればそれを、キャンセル・失敗・混雑で使えなければ改めて識別する
+    if species_job is not None and not species_job.cancelled():
+        try:
+            species = await asyncio.wrap_future(species_job)
+            if not species.get('busy'):
+                return species
+        except asyncio.CancelledError:
+            if not species_job.cancelled():
+                raise
+        except Exception as e:
+            print(f"Speculative identification failed: {e}")
+    return await identify_species_async(image_bytes)
+
+
+async def _no_fishery_rights() -> Dict:
+    return {
+        'hasFisheryRights': False,
+        'protectedSpecies': [],
+        'restrictions': 'None',
+        'details': []
+    }
+
+
+async def identify_and_analyze_fish_async(image_bytes: bytes, prefecture: str, city: str = None,
+                                          latitude: float = None, longitude: float = None,
+                                          species_job: concurrent.futures.Future = None) -> Dict:
+    location = f"{city}, {prefecture}" if city else prefecture
+
+    # 漁業権の取得と魚種の識別を同時に実行する
+    print(f"Getting fishery rights data and identifying fish: {location}")
+    species, fishery_rights_data = await asyncio.gather(
+        _await_species(image_bytes, species_job),
+        get_fishery_rights_by_location_async(latitude, longitude) if latitude and longitude else _no_fishery_rights(),
+    )
+
+    if not species.get('success'):
+        return species
+
+    has_fishing_rights = fishery_rights_data.get('hasFisheryRights', False)
+    protected_species = fishery_rights_data.get('protectedSpecies', [])
+    restrictions = fishery_rights_data.get('restrictions', 'None')
+
+    print(f"Fishing rights: {has_fishing_rights}")
+    print(f"Protected species: {protected_species}")
+    print(f"Restrictions: {restrictions}")
+
+    # 漁業権データが古い（APIが使えずキャッシュで判定）／取得できなかったこと、魚種識別をキャッシュから返したことを結果に含める
+    data_status = {
+        "fisheryRightsStale": fishery_rights_data.get('stale', False),
+        "fisheryRightsAvailable": fishery_rights_data.get('available', True),
+        "fisheryRightsFetchedAt": fishery_rights_data.get('fetchedAt'),
+        # 魚種識別を結果キャッシュから返した（漁業権と持ち帰りの判定は今回行ったもの）
+        "fromCache": species.get('fromCache', False),
+    }
+
+    fish_name_ja = species['fishNameJa']
+    fish_name_en = species['fishNameEn']
+    scientific_name = species['scientificName']
+    is_edible = species['isEdible']
+    is_poisonous = species['isPoisonous']
+
+    # 保護魚種との照合は両方の結果が揃ってからローカルで行う
+    matched_species = match_protected_species(species, protected_species)
+    is_protected = len(matched_species) > 0
+    print(f"Matched protected species: {matched_species}")
+
+    print(f"Identified fish: {fish_name_ja} ({fish_name_en})")
+    print(f"Poisonous: {is_poisonous}")
+
+    if has_fishing_rights and is_protected:
+        print(f"ILLEGAL: Fishing rights exist in this area")
+        return {
+            "success": False,
+            "isLegal": False,
+            "fishNameJa": fish_name_ja,
+            "fishNameEn": fish_name_en,
+            "scientificName": scientific_name,
+            "isEdible": is_edible,
+            "isPoisonous": is_poisonous,
+            "gyogyoken": restrictions,
+            "message": f"Fishing rights area. Taking home prohibited.",
+            **data_status
+        }
+    elif not data_status['fisheryRightsAvailable']:
+        # 漁業権データを取得できず、保護魚種かどうかを確認できない（「持ち帰りOK」とはしない）
+        print(f"UNKNOWN: Fishing rights data unavailable")
+        return {
+            "success": True,
+            "isLegal": None,
+            "fishNameJa": fish_name_ja,
+            "fishNameEn": fish_name_en,
+            "scientificName": scientific_name,
+            "isEdible": is_edible,
+            "isPoisonous": is_poisonous,
+            "message": "Fishing rights data unavailable. Could not check whether taking home is allowed.",
+            **data_status
+        }
+    else:
+        print(f"LEGAL: No fishing rights in this area")
+        return {
+            "success": True,
+            "isLegal": True,
+            "fishNameJa": fish_name_ja,
+            "fishNameEn": fish_name_en,
+            "scientificName": scientific_name,
+            "isEdible": is_edible,
+            "isPoisonous": is_poisonous,
+            **data_status
+        }
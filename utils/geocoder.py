@@ -0,0 +1,29 @@
+from geopy.adapters import BaseSyncAdapter, RequestsAdapter
+from geopy.geocoders import ArcGIS
+
+from .http_client import get_http_session, get_timeout
+
+
+class SharedSessionAdapter(RequestsAdapter):
+    """
+    geopyの通信に共通HTTPレイヤーのセッションを使うアダプター。
+    ArcGISへの接続もプロセス全体のコネクションプールで使い回す。
+    """
+
+    def __init__(self, *, proxies, ssl_context):
+        # RequestsAdapterは独自のセッションを作るので、基底クラスの初期化だけ行う
+        BaseSyncAdapter.__init__(self, proxies=proxies, ssl_context=ssl_context)
+        self.session = get_http_session()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # 共有セッションは閉じない
+        pass
+
+    def __del__(self):
+        pass
+
+
+def create_geolocator(user_agent: str = "uochecker-app-v1.0") -> ArcGIS:
+    # 共有セッションを使うArcGISジオコーダー
+    _, read_timeout = get_timeout('arcgis')
+    return ArcGIS(user_agent=user_agent, timeout=read_timeout, adapter_factory=SharedSessionAdapter)
@@ -0,0 +1,99 @@
+import math
+from typing import Tuple
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE_MAP = {c: i for i, c in enumerate(_BASE32)}
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+def encode(latitude: float, longitude: float, precision: int) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # 偶数ビットは経度、奇数ビットは緯度
+
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def decode_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """
+    ジオハッシュのタイル範囲を (南端緯度, 北端緯度, 西端経度, 東端経度) で返す関数。
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for c in geohash:
+        value = _DECODE_MAP[c]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def tile_center(geohash: str) -> Tuple[float, float, float]:
+    """
+    タイルの中心座標と、中心からタイルの角までの距離（メートル）を返す関数。
+    """
+    south, north, west, east = decode_bbox(geohash)
+    center_lat = (south + north) / 2
+    center_lon = (west + east) / 2
+    half_height = (north - south) / 2 * METERS_PER_DEGREE
+    half_width = (east - west) / 2 * METERS_PER_DEGREE * math.cos(math.radians(center_lat))
+    return center_lat, center_lon, math.hypot(half_height, half_width)
+
+
+def cell_size_m(precision: int) -> Tuple[float, float]:
+    # 赤道上（最も横に長い）でのタイルの高さと幅
+    lat_bits = (5 * precision) // 2
+    lon_bits = 5 * precision - lat_bits
+    height = 180 / (2 ** lat_bits) * METERS_PER_DEGREE
+    width = 360 / (2 ** lon_bits) * METERS_PER_DEGREE
+    return height, width
+
+
+def precision_for_radius(radius_m: float, ratio: float = 0.25) -> int:
+    """
+    検索半径に対して、タイル中心から角までの距離が radius_m * ratio 以下になる最も粗い精度を返す関数。
+    """
+    for precision in range(1, 13):
+        height, width = cell_size_m(precision)
+        if math.hypot(height, width) / 2 <= radius_m * ratio:
+            return precision
+    return 12
@@ -0,0 +1,70 @@
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+from .geohash import METERS_PER_DEGREE
+
+
+def rings_to_arrays(rings: List[List[List[float]]]) -> List[np.ndarray]:
+    # ArcGISのrings（[経度, 緯度]の配列）をNumPy配列に変換
+    return [np.asarray(ring, dtype=np.float64)[:, :2] for ring in rings if len(ring) >= 3]
+
+
+def rings_bbox(rings: List[np.ndarray]) -> Tuple[float, float, float, float]:
+    # (最小経度, 最小緯度, 最大経度, 最大緯度)
+    points = np.concatenate(rings)
+    min_x, min_y = points.min(axis=0)
+    max_x, max_y = points.max(axis=0)
+    return float(min_x), float(min_y), float(max_x), float(max_y)
+
+
+def ring_edges(rings: List[np.ndarray]) -> np.ndarray:
+    """
+    多角形の全リングの辺を (辺の数, 4) の配列 [始点経度, 始点緯度, 終点経度, 終点緯度] にまとめる関数。
+    閉じていないリングも閉じた辺の集合として扱う。
+    """
+    return np.concatenate([np.hstack([ring, np.roll(ring, -1, axis=0)]) for ring in rings])
+
+
+def polygon_distances_m(edge_sets: List[np.ndarray], latitude: float, longitude: float) -> np.ndarray:
+    """
+    地点から複数の多角形までの距離（メートル、内部なら0）を1回のベクトル演算で求める関数。
+    全多角形の辺を連結し、地点中心の局所平面（正距円筒図法）で
+    点と線分の距離の最小値と、レイキャスティングの交差数の偶奇を多角形ごとに集計する。
+    """
+    if not edge_sets:
+        return np.empty(0, dtype=np.float64)
+
+    counts = np.fromiter((len(e) for e in edge_sets), dtype=np.int64, count=len(edge_sets))
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    edges = np.concatenate(edge_sets)
+
+    scale_x = METERS_PER_DEGREE * math.cos(math.radians(latitude))
+    x1 = (edges[:, 0] - longitude) * scale_x
+    y1 = (edges[:, 1] - latitude) * METERS_PER_DEGREE
+    x2 = (edges[:, 2] - longitude) * scale_x
+    y2 = (edges[:, 3] - latitude) * METERS_PER_DEGREE
+    dx = x2 - x1
+    dy = y2 - y1
+
+    # 原点から各辺への最短距離
+    length2 = dx * dx + dy * dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(length2 > 0, np.clip(-(x1 * dx + y1 * dy) / length2, 0.0, 1.0), 0.0)
+    edge_distance = np.hypot(x1 + t * dx, y1 + t * dy)
+    min_distance = np.minimum.reduceat(edge_distance, offsets)
+
+    # 原点から+x方向へのレイと交差する辺の数（偶奇規則で穴にも対応）
+    straddles = (y1 > 0) != (y2 > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x1 - y1 * dx / dy
+    crossings = (straddles & (x_cross > 0)).astype(np.int64)
+    inside = np.add.reduceat(crossings, offsets) % 2 == 1
+
+    return np.where(inside, 0.0, min_distance)
+
+
+def point_to_polygon_distance_m(rings: List[np.ndarray], latitude: float, longitude: float) -> float:
+    # 地点から1つの多角形までの距離（内部なら0）
+    return float(polygon_distances_m([ring_edges(rings)], latitude, longitude)[0])
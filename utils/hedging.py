@@ -0,0 +1,133 @@
+"""
+遅いリクエストの待ち時間（テールレイテンシ）を抑えるヘッジリクエスト。
+最初のリクエストが期限までに返らなければ2つ目を送り、先に有効な結果を返した方を採用する。
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import numpy as np
+
+T = TypeVar('T')
+
+
+class HedgeStats:
+    """
+    ヘッジの発生率・勝った側・レイテンシ分布を記録するクラス。
+    ヘッジを送るまでの期限は、直近の1回目のリクエストの応答時間のパーセンタイルから決める。
+    """
+
+    def __init__(self, percentile: float = 95.0, default_delay: float = 4.0, min_delay: float = 0.5,
+                 min_samples: int = 20, window: int = 500):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+
+        self._attempt_latencies = deque(maxlen=window)  # 1回目のリクエストが返るまでの時間
+        self._latencies = deque(maxlen=window)  # 呼び出し元から見た時間
+        self._lock = threading.Lock()
+        self._counts = {
+            'requests': 0,
+            'hedged': 0,
+            'primaryWins': 0,
+            'hedgeWins': 0,
+            'failures': 0,
+        }
+
+    def deadline(self) -> float:
+        # 十分なサンプルが集まるまでは既定値を使う
+        with self._lock:
+            if len(self._attempt_latencies) < self.min_samples:
+                return self.default_delay
+            samples = np.fromiter(self._attempt_latencies, dtype=np.float64)
+        return max(self.min_delay, float(np.percentile(samples, self.percentile)))
+
+    def record_attempt(self, seconds: float) -> None:
+        with self._lock:
+            self._attempt_latencies.append(seconds)
+
+    def record(self, seconds: float, hedged: bool, winner: Optional[str]) -> None:
+        with self._lock:
+            self._counts['requests'] += 1
+            self._counts['hedged'] += int(hedged)
+            if winner == 'primary':
+                self._counts['primaryWins'] += 1
+            elif winner == 'hedge':
+                self._counts['hedgeWins'] += 1
+            else:
+                self._counts['failures'] += 1
+            self._latencies.append(seconds)
+
+    def stats(self) -> Dict:
+        deadline = self.deadline()
+        with self._lock:
+            stats = dict(self._counts)
+            latencies = np.fromiter(self._latencies, dtype=np.float64)
+        stats['hedgeRate'] = stats['hedged'] / stats['requests'] if stats['requests'] else 0.0
+        stats['deadline'] = deadline
+        if len(latencies):
+            p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99])
+            stats['latency'] = {'p50': float(p50), 'p90': float(p90), 'p95': float(p95), 'p99': float(p99),
+                                'max': float(latencies.max())}
+        return stats
+
+
+async def hedged_call(primary: Callable[[], Awaitable[T]], hedge: Callable[[], Awaitable[T]],
+                      stats: HedgeStats, is_valid: Callable[[T], bool]) -> T:
+    """
+    primaryを実行し、期限までに有効な結果が無ければhedgeも実行して、先に返った有効な結果を返す関数。
+    primaryが期限前に失敗した場合はすぐにhedgeを送る。残ったリクエストはキャンセルする。
+    両方とも有効な結果を返さなかった場合は、最後の結果を返すか最後の例外を送出する。
+    """
+    started = time.perf_counter()
+    deadline = stats.deadline()
+    tasks = {asyncio.ensure_future(primary()): 'primary'}
+    hedged = False
+    winner = None
+    last_result = None
+    last_error = None
+
+    def start_hedge():
+        nonlocal hedged
+        hedged = True
+        tasks[asyncio.ensure_future(hedge())] = 'hedge'
+
+    try:
+        while tasks:
+            timeout = None if hedged else max(0.0, deadline - (time.perf_counter() - started))
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                print(f"Hedging request after {deadline:.2f}s")
+                start_hedge()
+                continue
+
+            for task in done:
+                label = tasks.pop(task)
+                if label == 'primary':
+                    stats.record_attempt(time.perf_counter() - started)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if is_valid(result):
+                    winner = label
+                    return result
+                last_result = result
+
+            if not tasks and not hedged:
+                start_hedge()
+    finally:
+        for task, label in tasks.items():
+            if label == 'primary':
+                # 打ち切った1回目は少なくともここまでかかったとして記録する（分布が短い側に偏らないように）
+                stats.record_attempt(time.perf_counter() - started)
+            task.cancel()
+        stats.record(time.perf_counter() - started, hedged, winner)
+
+    if last_result is not None:
+        return last_result
+    raise last_error
@@ -0,0 +1,295 @@
+"""
+外部API（海しる・HeartRails・ArcGIS）への通信をまとめる共通HTTPレイヤー。
+プロセス全体で1つのコネクションプールを共有してTLSハンドシェイクを使い回し、
+エンドポイントごとのタイムアウトとジッター付きの再試行、接続再利用の統計を提供する。
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .lazy_import import lazy_module
+
+# aiohttpは非同期の経路（識別・先読み）で初めて使うので、最初のページ表示では読み込まない
+aiohttp = lazy_module('aiohttp')
+
+USER_AGENT = 'UOChecker/1.0'
+
+# 再試行するHTTPステータス
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# エンドポイントごとの設定（timeoutは (接続, 読み込み) 秒）
+# retry_read: 読み込みタイムアウトなど送信後のエラーも再試行するか
+# deadline: 再試行を含めた1回の呼び出し全体の期限（秒、非同期の経路）
+# verify: TLS証明書を検証するか（接続プールは検証の有無で分かれるので、呼び出し側では指定しない）
+ENDPOINTS = {
+    'msil': {
+        'prefix': 'https://api.msil.go.jp/',
+        'timeout': (3.05, 10),
+        'retries': 2,
+        # 海しるのqueryは読み取りのみなので、POST（OBJECTID指定の一括取得）も再試行してよい
+        'methods': ('GET', 'HEAD', 'POST'),
+        # 応答の遅い海しるを待ち直すとキャッシュへの切り替えが遅れるので、読み込みタイムアウトは再試行しない
+        'retry_read': False,
+        'deadline': 15,
+        # 海しるは従来どおり証明書を検証しない
+        'verify': False,
+    },
+    'heartrails': {
+        'prefix': 'https://geoapi.heartrails.com/',
+        'timeout': (3.05, 5),
+        'retries': 2,
+        'methods': ('GET', 'HEAD'),
+    },
+    'arcgis': {
+        'prefix': 'https://geocode.arcgis.com/',
+        'timeout': (3.05, 10),
+        'retries': 2,
+        'methods': ('GET', 'HEAD'),
+    },
+}
+
+BACKOFF_FACTOR = 0.3
+BACKOFF_JITTER = 0.3
+BACKOFF_MAX = 5.0
+
+_session = None
+_session_lock = threading.Lock()
+_aiohttp_sessions = weakref.WeakKeyDictionary()  # イベントループ -> aiohttp.ClientSession
+
+_stats_lock = threading.Lock()
+_endpoint_stats = {}  # エンドポイント名 -> 呼び出し回数など
+_async_host_stats = {}  # ホスト -> aiohttpの接続統計
+
+
+def get_timeout(endpoint: str) -> Tuple[float, float]:
+    """
+    エンドポイントの (接続, 読み込み) タイムアウトを返す関数。
+    HTTP_TIMEOUT_<名前>（例: HTTP_TIMEOUT_MSIL=15）で読み込みタイムアウトを上書きできる。
+    """
+    connect, read = ENDPOINTS[endpoint]['timeout']
+    override = os.environ.get(f'HTTP_TIMEOUT_{endpoint.upper()}')
+    if override:
+        read = float(override)
+    return connect, read
+
+
+def get_deadline(endpoint: str) -> Optional[float]:
+    """
+    エンドポイントの再試行を含めた呼び出し全体の期限（秒）を返す関数（無ければNone）。
+    HTTP_DEADLINE_<名前>（例: HTTP_DEADLINE_MSIL=20）で上書きできる。
+    """
+    override = os.environ.get(f'HTTP_DEADLINE_{endpoint.upper()}')
+    if override:
+        return float(override)
+    return ENDPOINTS[endpoint].get('deadline')
+
+
+def _pool_per_host() -> int:
+    return int(os.environ.get('HTTP_POOL_PER_HOST', '20'))
+
+
+def _make_retry(endpoint: Optional[str]) -> Retry:
+    config = ENDPOINTS.get(endpoint, {})
+    return Retry(
+        total=config.get('retries', 2),
+        read=None if config.get('retry_read', True) else 0,
+        backoff_factor=BACKOFF_FACTOR,
+        backoff_jitter=BACKOFF_JITTER,
+        backoff_max=BACKOFF_MAX,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(config.get('methods', ('GET', 'HEAD'))),
+        respect_retry_after_header=True,
+        # 再試行し尽くした場合も例外にせず、最後のレスポンスを呼び出し元に返す
+        raise_on_status=False,
+    )
+
+
+def get_http_session() -> requests.Session:
+    """
+    プロセス全体で共有するrequestsのセッションを返す関数。
+    エンドポイントごとにプールと再試行設定を分けたアダプターをマウントしている。
+    APIキーなどのヘッダーは他のホストに送らないよう、セッションではなくリクエストごとに渡すこと。
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers['User-Agent'] = USER_AGENT
+                per_host = _pool_per_host()
+                default_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=per_host,
+                                              max_retries=_make_retry(None))
+                session.mount('https://', default_adapter)
+                session.mount('http://', default_adapter)
+                for name, config in ENDPOINTS.items():
+                    session.mount(config['prefix'], HTTPAdapter(
+                        pool_connections=1, pool_maxsize=per_host, max_retries=_make_retry(name)
+                    ))
+                _session = session
+    return _session
+
+
+def _record(endpoint: str, seconds: float, retries: int = 0, error: bool = False) -> None:
+    with _stats_lock:
+        stats = _endpoint_stats.setdefault(endpoint, {
+            'requests': 0, 'retries': 0, 'errors': 0, 'totalSeconds': 0.0,
+        })
+        stats['requests'] += 1
+        stats['retries'] += retries
+        stats['errors'] += int(error)
+        stats['totalSeconds'] += seconds
+
+
+def request(endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    共有セッションでリクエストを送る関数（タイムアウトと証明書の検証はエンドポイントの設定を使う）。
+    通信エラーは再試行した後もそのまま例外を送出する。
+    """
+    kwargs.setdefault('timeout', get_timeout(endpoint))
+    kwargs.setdefault('verify', ENDPOINTS[endpoint].get('verify', True))
+    started = time.perf_counter()
+    try:
+        response = get_http_session().request(method, url, **kwargs)
+    except requests.RequestException:
+        _record(endpoint, time.perf_counter() - started, error=True)
+        raise
+    history = getattr(getattr(response.raw, 'retries', None), 'history', None) or ()
+    _record(endpoint, time.perf_counter() - started, retries=len(history))
+    return response
+
+
+def _backoff_seconds(attempt: int) -> float:
+    # urllib3のRetryと同じ指数バックオフ＋ジッター
+    return min(BACKOFF_MAX, BACKOFF_FACTOR * (2 ** attempt) + random.uniform(0, BACKOFF_JITTER))
+
+
+def _trace_config() -> 'aiohttp.TraceConfig':
+    # aiohttpの新規接続・再利用の回数をホストごとに数える
+    async def on_request_start(session, ctx, params):
+        ctx.host = params.url.host
+        with _stats_lock:
+            stats = _async_host_stats.setdefault(ctx.host, {
+                'requests': 0, 'newConnections': 0, 'reusedConnections': 0,
+            })
+            stats['requests'] += 1
+
+    async def on_connection_create_end(session, ctx, params):
+        with _stats_lock:
+            _async_host_stats[ctx.host]['newConnections'] += 1
+
+    async def on_connection_reuseconn(session, ctx, params):
+        with _stats_lock:
+            _async_host_stats[ctx.host]['reusedConnections'] += 1
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace_config
+
+
+def get_aiohttp_session() -> 'aiohttp.ClientSession':
+    """
+    実行中のイベントループ用のaiohttpセッションを返す関数（ループごとに1つ作って使い回す）。
+    """
+    loop = asyncio.get_running_loop()
+    session = _aiohttp_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=int(os.environ.get('HTTP_POOL_SIZE', '100')),
+            limit_per_host=_pool_per_host(),
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        session = aiohttp.ClientSession(connector=connector, headers={'User-Agent': USER_AGENT},
+                                        trace_configs=[_trace_config()])
+        _aiohttp_sessions[loop] = session
+    return session
+
+
+def _can_retry(attempt: int, retries: int, delay: float, deadline_at: Optional[float]) -> bool:
+    # 再試行の回数が残っていて、バックオフの後に期限までに次の試行を始められる場合だけ再試行する
+    return attempt < retries and (deadline_at is None or time.perf_counter() + delay < deadline_at)
+
+
+def _is_connect_error(error: Exception) -> bool:
+    # 接続の確立（DNS解決・接続タイムアウトを含む）で失敗したか（送信後のエラーと区別する）
+    connect_errors = (aiohttp.ClientConnectorError, getattr(aiohttp, 'ConnectionTimeoutError', aiohttp.ClientConnectorError))
+    return isinstance(error, connect_errors)
+
+
+async def _read_response(method: str, url: str, kwargs: Dict) -> Tuple[int, bytes]:
+    async with get_aiohttp_session().request(method, url, **kwargs) as response:
+        return response.status, await response.read()
+
+
+async def request_async(endpoint: str, method: str, url: str, **kwargs) -> Tuple[int, bytes]:
+    """
+    request の非同期版。(ステータス, 本文) を返す。
+    接続エラー・タイムアウト・再試行対象のステータスはジッター付きのバックオフで再試行する。
+    エンドポイントに期限（get_deadline）があれば、再試行を含めてその時間内に結果を返すか例外を送出する。
+    """
+    config = ENDPOINTS[endpoint]
+    connect, read = get_timeout(endpoint)
+    kwargs.setdefault('timeout', aiohttp.ClientTimeout(total=connect + read, sock_connect=connect, sock_read=read))
+    # aiohttpは ssl=False で証明書を検証しない（Trueは既定の検証）
+    kwargs.setdefault('ssl', config.get('verify', True))
+    retries = config['retries'] if method.upper() in config['methods'] else 0
+    started = time.perf_counter()
+    deadline = get_deadline(endpoint)
+    deadline_at = started + deadline if deadline is not None else None
+
+    attempt = 0
+    while True:
+        remaining = deadline_at - time.perf_counter() if deadline_at is not None else None
+        delay = _backoff_seconds(attempt)
+        try:
+            status, body = await asyncio.wait_for(_read_response(method, url, kwargs), remaining)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            retry_read = config.get('retry_read', True) or _is_connect_error(e)
+            if not retry_read or not _can_retry(attempt, retries, delay, deadline_at):
+                _record(endpoint, time.perf_counter() - started, retries=attempt, error=True)
+                raise
+        else:
+            if status not in RETRY_STATUSES or not _can_retry(attempt, retries, delay, deadline_at):
+                _record(endpoint, time.perf_counter() - started, retries=attempt)
+                return status, body
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def get_http_metrics() -> Dict:
+    """
+    通信の統計を返す関数。
+    pools: requests（urllib3）のホストごとの新規接続数とリクエスト数
+    asyncHosts: aiohttpのホストごとの新規接続数と再利用数
+    endpoints: エンドポイントごとの呼び出し回数・再試行回数・エラー数・合計時間
+    """
+    pools = {}
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            for pool_key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(pool_key)
+                if pool is None:
+                    continue
+                stats = pools.setdefault(pool.host, {'requests': 0, 'newConnections': 0})
+                stats['requests'] += pool.num_requests
+                stats['newConnections'] += pool.num_connections
+    for stats in pools.values():
+        requests_count = stats['requests']
+        stats['reuseRate'] = 1 - stats['newConnections'] / requests_count if requests_count else 0.0
+
+    with _stats_lock:
+        return {
+            'pools': pools,
+            'asyncHosts': {host: dict(stats) for host, stats in _async_host_stats.items()},
+            'endpoints': {name: dict(stats) for name, stats in _endpoint_stats.items()},
+        }
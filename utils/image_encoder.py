@@ -0,0 +1,143 @@
+"""
+Gemini送信用画像のエンコーダー。
+バイト数（通信量）と画像トークン数の予算に収まるように、解像度と品質を選んでJPEG/WebPに変換する。
+品質は縮小したプローブ画像のエンコード結果から全体のサイズを見積もって二分探索する。
+"""
+import io
+import math
+import os
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+# Geminiの画像トークン: 384px以下は1枚258トークン、それより大きい画像は768px四方のタイルごとに258トークン
+TOKENS_PER_TILE = 258
+TILE_SIDE = 768
+SMALL_IMAGE_SIDE = 384
+
+MIN_QUALITY = 40
+MAX_QUALITY = 95
+# 試す長辺の候補（768の倍数はタイルの無駄が少ない）
+SIDE_LADDER = (1568, 1536, 1280, 1024, 768, 512)
+
+MIME_TYPES = {
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+}
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    if width <= SMALL_IMAGE_SIDE and height <= SMALL_IMAGE_SIDE:
+        return TOKENS_PER_TILE
+    return math.ceil(width / TILE_SIDE) * math.ceil(height / TILE_SIDE) * TOKENS_PER_TILE
+
+
+def image_mime_type(data: bytes) -> str:
+    # 先頭のバイト列から送信するMIMEタイプを判定する
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return MIME_TYPES['webp']
+    return MIME_TYPES['jpeg']
+
+
+def _encode(image: Image.Image, fmt: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        # method=2: 圧縮率は少し下がるが、探索で何度もエンコードするため速度を優先する
+        image.save(buffer, format='WEBP', quality=quality, method=2)
+    else:
+        image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def _fit(image: Image.Image, side: int) -> Image.Image:
+    if max(image.size) <= side:
+        return image
+    resized = image.copy()
+    resized.thumbnail((side, side))
+    return resized
+
+
+def _search_quality(image: Image.Image, fmt: str, byte_budget: int) -> Optional[int]:
+    """
+    byte_budget以下に収まる最も高い品質を返す（収まらなければNone）。
+    全体のエンコードは最高品質の1回だけで、残りは縦横1/2のプローブで見積もる。
+    """
+    full_size = len(_encode(image, fmt, MAX_QUALITY))
+    if full_size <= byte_budget:
+        return MAX_QUALITY
+
+    probe = image.reduce(2) if min(image.size) >= 256 else image
+    # 同じ品質でのプローブと全体のサイズ比で、プローブのサイズから全体のサイズを見積もる
+    ratio = full_size / len(_encode(probe, fmt, MAX_QUALITY))
+
+    low, high = MIN_QUALITY, MAX_QUALITY - 1
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        if len(_encode(probe, fmt, quality)) * ratio <= byte_budget:
+            best = quality
+            low = quality + 1
+        else:
+            high = quality - 1
+    return best
+
+
+def _default_budgets() -> Tuple[int, int, str]:
+    # UPLOAD_BYTE_BUDGET / UPLOAD_TOKEN_BUDGET は0で無制限、UPLOAD_FORMATは jpeg / webp
+    return (int(os.environ.get('UPLOAD_BYTE_BUDGET', '400000')),
+            int(os.environ.get('UPLOAD_TOKEN_BUDGET', '0')),
+            os.environ.get('UPLOAD_FORMAT', 'jpeg').lower())
+
+
+def encode_for_upload(image: Image.Image, byte_budget: int = None, token_budget: int = None,
+                      fmt: str = None) -> Dict:
+    """
+    RGB画像を予算内のJPEG/WebPに変換する関数。
+    大きい解像度から順に、予算に収まる品質があればその解像度で、無ければ1段小さい解像度で試す。
+    戻り値: {'data', 'mimeType', 'quality', 'width', 'height', 'imageTokens'}
+    """
+    default_bytes, default_tokens, default_fmt = _default_budgets()
+    byte_budget = default_bytes if byte_budget is None else byte_budget
+    token_budget = default_tokens if token_budget is None else token_budget
+    fmt = (fmt or default_fmt).lower()
+    if fmt not in MIME_TYPES:
+        fmt = 'jpeg'
+
+    longest = max(image.size)
+    sides = [longest] + [side for side in SIDE_LADDER if side < longest]
+    if token_budget:
+        fitting = [side for side in sides
+                   if estimate_image_tokens(*_fit(image, side).size) <= token_budget]
+        sides = fitting or sides[-1:]
+
+    candidate = None
+    for side in sides:
+        resized = _fit(image, side)
+        if not byte_budget:
+            candidate = (resized, MAX_QUALITY, _encode(resized, fmt, MAX_QUALITY))
+            break
+        quality = _search_quality(resized, fmt, byte_budget)
+        if quality is None:
+            candidate = (resized, MIN_QUALITY, None)
+            continue
+        data = _encode(resized, fmt, quality)
+        # 見積もりが外れて予算を超えた場合は品質を少しずつ下げる
+        while len(data) > byte_budget and quality > MIN_QUALITY:
+            quality = max(MIN_QUALITY, quality - 5)
+            data = _encode(resized, fmt, quality)
+        candidate = (resized, quality, data)
+        if len(data) <= byte_budget:
+            break
+
+    resized, quality, data = candidate
+    if data is None:
+        # どの解像度でも収まらない場合は最小の解像度・最低品質で送る
+        data = _encode(resized, fmt, quality)
+    return {
+        'data': data,
+        'mimeType': MIME_TYPES[fmt],
+        'quality': quality,
+        'width': resized.width,
+        'height': resized.height,
+        'imageTokens': estimate_image_tokens(resized.width, resized.height),
+    }
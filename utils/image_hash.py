@@ -0,0 +1,133 @@
+import io
+import os
+import threading
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8  # 8x8 = 64bitのハッシュ
+
+
+def compute_dhash(image_bytes: bytes, hash_size: int = HASH_SIZE) -> int:
+    """
+    画像のdHash（差分ハッシュ）を計算する関数。
+    縮小したグレースケール画像の横方向の輝度差をNumPyでまとめてビット化する。
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    # JPEGはdraftモードで1/8スケールのままデコードしてフル解像度の展開を避ける
+    image.draft('L', (hash_size * 8, hash_size * 8))
+    image = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    packed = np.packbits(bits)
+    return int.from_bytes(packed.tobytes(), 'big')
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    ハミング距離によるBK木。
+    三角不等式で枝刈りして、距離しきい値以内のハッシュを探索する。
+    """
+
+    def __init__(self):
+        self._root = None  # (ハッシュ, 値, {距離: 子ノード})
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, hash_value: int, value) -> None:
+        if self._root is None:
+            self._root = (hash_value, value, {})
+            self._size = 1
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(hash_value, node[0])
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (hash_value, value, {})
+                self._size += 1
+                return
+            node = child
+
+    def search(self, hash_value: int, max_distance: int) -> List[Tuple[int, object]]:
+        if self._root is None:
+            return []
+
+        results = []
+        stack = [self._root]
+        while stack:
+            node_hash, node_value, children = stack.pop()
+            distance = hamming_distance(hash_value, node_hash)
+            if distance <= max_distance:
+                results.append((distance, node_value))
+            low, high = distance - max_distance, distance + max_distance
+            for child_distance, child in children.items():
+                if low <= child_distance <= high:
+                    stack.append(child)
+        results.sort(key=lambda item: item[0])
+        return results
+
+
+class NearDuplicateIndex:
+    """
+    識別済み画像のdHashインデックス。
+    撮り直した画像がしきい値以内のハミング距離なら、保存済みの魚種情報を再利用する。
+    """
+
+    def __init__(self, max_distance: int = 3, max_entries: int = 10000):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._tree = BKTree()
+        self._entries = []  # (ハッシュ, コンテキスト, 値) 追加順
+        self._lock = threading.Lock()
+
+    def lookup(self, hash_value: int, context: Hashable = None) -> Optional[Dict]:
+        with self._lock:
+            matches = self._tree.search(hash_value, self.max_distance)
+        for distance, (entry_context, value) in matches:
+            if entry_context == context:
+                print(f"類似画像ヒット: ハミング距離 {distance}")
+                return dict(value)
+        return None
+
+    def add(self, hash_value: int, value: Dict, context: Hashable = None) -> None:
+        with self._lock:
+            self._entries.append((hash_value, context, dict(value)))
+            if len(self._entries) > self.max_entries:
+                # BK木は削除できないので、古い半分を捨てて作り直す
+                self._entries = self._entries[len(self._entries) // 2:]
+                self._tree = BKTree()
+                for entry_hash, entry_context, entry_value in self._entries:
+                    self._tree.add(entry_hash, (entry_context, entry_value))
+            else:
+                self._tree.add(hash_value, (context, dict(value)))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tree)
+
+
+_near_duplicate_index = None
+_near_duplicate_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    # プロセス全体で共有する類似画像インデックス
+    global _near_duplicate_index
+    if _near_duplicate_index is None:
+        with _near_duplicate_index_lock:
+            if _near_duplicate_index is None:
+                _near_duplicate_index = NearDuplicateIndex(
+                    max_distance=int(os.environ.get('PHASH_MAX_DISTANCE', '3')),
+                    max_entries=int(os.environ.get('PHASH_MAX_ENTRIES', '10000')),
+                )
+    return _near_duplicate_index
@@ -0,0 +1,174 @@
+"""
+画像の前処理をプロセスプールで実行する仕組み。
+デコード・縮小・エンコードはCPUを使い続けるため、Streamlitのスクリプトスレッドで実行すると
+同じコンテナの他のセッションまで止まる。別プロセスで実行してコア数に応じて並列に処理する。
+デコードする前に、ファイルサイズと画素数（ヘッダーだけ読む）の上限を確認する。
+"""
+import concurrent.futures
+import io
+import multiprocessing
+import os
+import threading
+from typing import Dict
+
+from PIL import Image
+
+from . import image_preprocess
+
+
+class ImageRejected(ValueError):
+    """大きすぎる・読めない画像をデコードする前に断ったときの例外"""
+
+
+class ImagePoolBusy(RuntimeError):
+    """前処理の待ち行列が一杯、または時間内に終わらなかったときの例外"""
+
+
+def _available_cpus() -> int:
+    # コンテナでCPUが割り当てられている場合は、その数を使う
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _init_worker(max_pixels: int) -> None:
+    # ワーカー側でもPILの展開爆弾の上限を同じ値にしておく
+    Image.MAX_IMAGE_PIXELS = max_pixels
+
+
+class ImagePool:
+    """
+    前処理用のプロセスプール（プロセス全体で1つ）。
+    同時に受け付ける数を制限し、タスクごとに時間制限を設ける。
+    時間内に終わらなかった場合は、プールを作り直して後の画像が詰まらないようにする。
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float, max_bytes: int, max_pixels: int):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'timeouts': 0,
+            'restarts': 0,
+        }
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Streamlitはスレッドを使うので、forkではなくforkserver/spawnでワーカーを起動する
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=context,
+                    initializer=_init_worker, initargs=(self.max_pixels,),
+                )
+            return self._executor
+
+    def _restart(self, executor: concurrent.futures.ProcessPoolExecutor) -> None:
+        # 止まったワーカーを含むプールを捨てて、次のタスクから新しいプールを使う
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._stats['restarts'] += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def check(self, data: bytes) -> None:
+        """デコードする前に、ファイルサイズとヘッダーの画素数を確認する"""
+        if len(data) > self.max_bytes:
+            raise ImageRejected(f'画像のファイルサイズが大きすぎます（{len(data) / 1e6:.1f}MB）')
+        image_preprocess.register_heif_opener()
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+        except Image.DecompressionBombError as e:
+            raise ImageRejected('画像の画素数が大きすぎます') from e
+        except Exception as e:
+            raise ImageRejected(f'画像を読み込めませんでした: {e}') from e
+        if width * height > self.max_pixels:
+            raise ImageRejected(f'画像の画素数が大きすぎます（{width}x{height}）')
+
+    def preprocess(self, data: bytes, **kwargs) -> Dict:
+        """
+        image_preprocess.preprocess_image をワーカープロセスで実行して結果を返す関数。
+        引数と戻り値は bytes / dict のままプロセス間で受け渡す。
+        """
+        try:
+            self.check(data)
+        except ImageRejected:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise ImagePoolBusy('画像の処理が混み合っています。しばらくしてからもう一度お試しください。')
+        try:
+            executor = self._get_executor()
+            with self._lock:
+                self._stats['submitted'] += 1
+            try:
+                future = executor.submit(image_preprocess.preprocess_image, data, **kwargs)
+            except concurrent.futures.BrokenExecutor:
+                # ワーカーが異常終了していた場合は作り直して1回だけやり直す
+                self._restart(executor)
+                executor = self._get_executor()
+                future = executor.submit(image_preprocess.preprocess_image, data, **kwargs)
+            try:
+                return future.result(timeout=self.timeout)
+            except concurrent.futures.TimeoutError:
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                if not future.cancel():
+                    self._restart(executor)
+                raise ImagePoolBusy(f'画像の処理が{self.timeout:g}秒以内に終わりませんでした')
+            except concurrent.futures.BrokenExecutor:
+                self._restart(executor)
+                raise
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['workers'] = self.workers
+            stats['running'] = self._executor is not None
+        return stats
+
+
+_image_pool = None
+_image_pool_lock = threading.Lock()
+
+
+def get_image_pool() -> ImagePool:
+    # プロセス全体で共有する前処理用のプール
+    global _image_pool
+    if _image_pool is None:
+        with _image_pool_lock:
+            if _image_pool is None:
+                workers = int(os.environ.get('IMAGE_POOL_WORKERS', '0')) or _available_cpus()
+                _image_pool = ImagePool(
+                    workers=workers,
+                    max_pending=int(os.environ.get('IMAGE_POOL_MAX_PENDING', str(max(1, workers) * 4))),
+                    timeout=float(os.environ.get('IMAGE_POOL_TIMEOUT', '20')),
+                    max_bytes=int(os.environ.get('IMAGE_MAX_BYTES', str(30 * 1024 * 1024))),
+                    max_pixels=int(os.environ.get('IMAGE_MAX_PIXELS', '64000000')),
+                )
+    return _image_pool
+
+
+def preprocess_image_in_pool(data: bytes, **kwargs) -> Dict:
+    """
+    アップロード画像をプロセスプールで前処理する関数（戻り値は preprocess_image と同じ）。
+    IMAGE_POOL_WORKERS=-1 の場合はプールを使わず、呼び出し元のスレッドで処理する。
+    """
+    pool = get_image_pool()
+    if pool.workers < 0:
+        pool.check(data)
+        return image_preprocess.preprocess_image(data, **kwargs)
+    return pool.preprocess(data, **kwargs)
@@ -0,0 +1,112 @@
+"""
+アップロード画像の前処理（1回のデコードでプレビューとGemini送信用の画像を作る）。
+JPEGはドラフトモードで縮小デコードし、HEICは十分な大きさの埋め込みサムネイルがあればそれを使う。
+向きの補正は縮小後の小さい画像に対して行い、送信用の画像はバイト数・トークン数の予算内に収める。
+"""
+import io
+import threading
+from typing import Dict, Tuple
+
+from PIL import Image
+
+from .image_encoder import encode_for_upload
+
+# pillow_heifは読み込みに時間がかかるので、起動時ではなく最初に画像を開くとき（ワーカープロセス内など）に読み込む
+_heif_available = None
+_heif_lock = threading.Lock()
+
+# Geminiに送る画像の長辺
+UPLOAD_MAX_SIDE = 1568
+# 画面表示用のプレビューの長辺
+PREVIEW_MAX_SIDE = 800
+PREVIEW_QUALITY = 85
+
+# EXIFのOrientation → 正しい向きに戻す変換（ImageOps.exif_transposeと同じ対応）
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def register_heif_opener() -> bool:
+    """
+    HEIC/HEIFを開けるように、pillow_heifをPillowに登録する関数（プロセスごとに最初の1回だけimportする）。
+    pillow_heifが無い環境ではFalseを返す。
+    """
+    global _heif_available
+    if _heif_available is None:
+        with _heif_lock:
+            if _heif_available is None:
+                try:
+                    import pillow_heif
+                    pillow_heif.register_heif_opener()
+                    _heif_available = True
+                except ImportError:  # HEICを使わない環境
+                    _heif_available = False
+    return _heif_available
+
+
+def _fit_size(size: Tuple[int, int], max_side: int) -> Tuple[int, int]:
+    # 縦横比を保って長辺をmax_side以下にした大きさ
+    width, height = size
+    scale = min(1.0, max_side / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _encode_jpeg(image: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def preprocess_image(data: bytes, max_side: int = UPLOAD_MAX_SIDE, preview_side: int = PREVIEW_MAX_SIDE,
+                     byte_budget: int = None, token_budget: int = None, upload_format: str = None) -> Dict:
+    """
+    画像のバイトデータを1回だけデコードして、Gemini送信用の画像とプレビュー用のJPEGを返す関数。
+    送信用の画像の予算と形式は image_encoder.encode_for_upload を参照（未指定なら環境変数の設定）。
+    戻り値: {'imageBytes', 'mimeType', 'quality', 'imageTokens', 'previewBytes', 'width', 'height',
+            'sourceFormat', 'sourceSize'}
+    """
+    register_heif_opener()
+    image = Image.open(io.BytesIO(data))
+    source_format = image.format
+    source_size = image.size
+    # 縮小デコードの前にEXIFの向きを読んでおく
+    orientation = image.getexif().get(0x0112, 1)
+
+    # JPEGはDCTの段階で1/2〜1/8に縮小してデコードする（長辺がmax_side以上になる範囲で最小の倍率）
+    # HEICは長辺がmax_side以上の埋め込みサムネイルがあればそれをデコードする
+    image.draft("RGB", _fit_size(source_size, max_side))
+
+    if image.mode in ("P", "1"):
+        # パレット画像はそのまま縮小できないので先に変換する
+        image = image.convert("RGB")
+    image.thumbnail((max_side, max_side))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    # 向きの補正は縮小後の画像に対して行う
+    method = _ORIENTATION_TRANSPOSE.get(orientation)
+    if method is not None:
+        image = image.transpose(method)
+
+    preview = image.copy()
+    preview.thumbnail((preview_side, preview_side))
+
+    upload = encode_for_upload(image, byte_budget, token_budget, upload_format)
+    return {
+        "imageBytes": upload["data"],
+        "mimeType": upload["mimeType"],
+        "quality": upload["quality"],
+        "imageTokens": upload["imageTokens"],
+        "previewBytes": _encode_jpeg(preview, PREVIEW_QUALITY),
+        "width": upload["width"],
+        "height": upload["height"],
+        "sourceFormat": source_format,
+        "sourceSize": source_size,
+    }
@@ -0,0 +1,42 @@
+"""
+読み込みに時間がかかるライブラリを、最初に使うときまでimportしない仕組み。
+起動時（最初のページ表示まで）に必要ないライブラリは lazy_module で参照し、
+表示後に warmup.start_warmup で裏で読み込んでおく。
+"""
+import importlib
+import threading
+from types import ModuleType
+
+
+class LazyModule:
+    """
+    属性に最初にアクセスしたときにモジュールをimportする代理オブジェクト。
+    例: genai = lazy_module('google.generativeai') → genai.configure(...) の時点でimportする
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    return LazyModule(name)
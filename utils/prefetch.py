@@ -0,0 +1,58 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+from typing import Optional
+
+from .aio import get_background_loop
+from .fishery_cache import fishery_tile_for
+from .fishery_rights_api import get_fishery_rights_by_location_async
+
+
+class FisheryPrefetcher:
+    """
+    マップのマーカーが動いたときに、その地点の漁業権を先に取得して共有キャッシュを温めるクラス（セッションごとに1つ）。
+    マーカーが続けて動いた場合は最後の地点だけを取得し（デバウンス）、離れた地点の取得はキャンセルする。
+    取得中に判定ボタンが押された場合は、同じタイルの問い合わせとしてまとめられる。
+    """
+
+    def __init__(self, debounce_seconds: float = 0.5):
+        self.debounce_seconds = debounce_seconds
+        self._job = None
+        self._tile = None
+        self._lock = threading.Lock()
+
+    def move_to(self, latitude: float, longitude: float) -> Optional[concurrent.futures.Future]:
+        tile = fishery_tile_for(latitude, longitude)
+        with self._lock:
+            # 同じタイル内の移動なら、実行中の取得をそのまま使う
+            if self._job is not None and self._tile == tile and not self._job.cancelled():
+                return self._job
+            self._cancel_locked()
+            self._tile = tile
+            self._job = asyncio.run_coroutine_threadsafe(
+                self._prefetch(latitude, longitude), get_background_loop()
+            )
+            return self._job
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancel_locked()
+
+    def _cancel_locked(self) -> None:
+        if self._job is not None and not self._job.done():
+            self._job.cancel()
+        self._job = None
+        self._tile = None
+
+    async def _prefetch(self, latitude: float, longitude: float) -> None:
+        await asyncio.sleep(self.debounce_seconds)
+        try:
+            await get_fishery_rights_by_location_async(latitude, longitude)
+        except Exception as e:
+            print(f"漁業権の先読みエラー: {e}")
+
+
+def create_fishery_prefetcher() -> FisheryPrefetcher:
+    # FISHERY_PREFETCH_DEBOUNCE: マーカーが止まってから取得を始めるまでの秒数
+    return FisheryPrefetcher(float(os.environ.get('FISHERY_PREFETCH_DEBOUNCE', '0.5')))
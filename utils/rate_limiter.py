@@ -0,0 +1,197 @@
+"""
+Gemini APIの呼び出しをクォータ（RPM/TPM）内に収めるための受付制御。
+トークンバケットで送信ペースを決め、空きが無い間は上限付きの待ち行列で順番を待たせる。
+行列が満杯、または待ち時間の上限を超えた場合は「混雑中・N秒後に再試行」として断る。
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from typing import Dict
+
+
+class AdmissionRejected(Exception):
+    """
+    混雑のため受け付けなかったことを表す例外。
+    retry_after: 再試行までの目安（秒）、position: 断った時点の待ち行列の長さ
+    """
+
+    def __init__(self, retry_after: float, position: int = 0, reason: str = 'queue_full'):
+        super().__init__(f"{reason}: retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+        self.position = position
+        self.reason = reason
+
+
+class TokenBucket:
+    """
+    rate（個/秒）で補充され、capacityまで貯まるトークンバケット。
+    残量はマイナスにもなり（使用量の後払いやクォータエラー後の休止）、その分だけ次の払い出しが遅れる。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        # amount個を払い出せるまでの秒数（0ならすぐ払い出せる）
+        self._refill(now)
+        # 1回分がバケットより大きい場合は満杯になった時点で払い出す
+        amount = min(amount, self.capacity)
+        if self._tokens >= amount:
+            return 0.0
+        return (amount - self._tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._tokens -= amount
+
+    def adjust(self, amount: float) -> None:
+        # 見積もりとの差を返金（正）または追加で徴収（負）する
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+    def pause(self, seconds: float, now: float) -> None:
+        # seconds秒の間は払い出さない
+        self._refill(now)
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+class AdmissionController:
+    """
+    RPM・TPMの2つのトークンバケットと、優先度付きの待ち行列（同じ優先度なら先着順）で
+    外部APIの呼び出しを受け付けるクラス。
+    クォータぴったりではなくheadroomの割合で送ることで、クォータエラーとの行き来を防ぐ。
+    待機はイベントループに依存しないポーリングで行うので、どのループ・スレッドからでも使える。
+    """
+
+    def __init__(self, rpm: float, tpm: float, max_queue: int = 50, max_wait: float = 20.0,
+                 headroom: float = 0.9, poll_interval: float = 0.05):
+        request_rate = rpm * headroom / 60
+        token_rate = tpm * headroom / 60
+        # 瞬間的な集中もクォータの集計を超えないよう、貯められるのは約1秒分まで
+        self.requests = TokenBucket(request_rate, max(1.0, request_rate))
+        self.tokens = TokenBucket(token_rate, max(1.0, token_rate))
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+
+        self._waiting = []  # (優先度, 受付番号) のヒープ
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {
+            'admitted': 0,
+            'queued': 0,
+            'rejected': 0,
+            'timedOut': 0,
+            'quotaErrors': 0,
+            'maxQueueLength': 0,
+        }
+
+    async def acquire(self, tokens: float, priority: int = 0, wait: bool = True) -> None:
+        """
+        呼び出し1回分（リクエスト1件とtokensトークン）を確保する。
+        priorityは小さいほど先に通す。wait=Falseの場合は待たずに、空きが無ければすぐ断る。
+        断る場合は AdmissionRejected を送出する。
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self._waiting and self._wait_time(tokens, now) <= 0:
+                self._admit(tokens)
+                return
+            if not wait:
+                self._stats['rejected'] += 1
+                raise AdmissionRejected(self._retry_after(tokens, now), len(self._waiting), 'no_capacity')
+            if len(self._waiting) >= self.max_queue:
+                self._stats['rejected'] += 1
+                raise AdmissionRejected(self._retry_after(tokens, now), len(self._waiting), 'queue_full')
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, entry)
+            self._stats['queued'] += 1
+            self._stats['maxQueueLength'] = max(self._stats['maxQueueLength'], len(self._waiting))
+            print(f"Gemini待ち行列: {len(self._waiting)}番目で待機")
+
+        deadline = time.monotonic() + self.max_wait
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    delay = self.poll_interval
+                    if self._waiting[0] == entry:
+                        delay = self._wait_time(tokens, now)
+                        if delay <= 0:
+                            heapq.heappop(self._waiting)
+                            self._admit(tokens)
+                            return
+                    if now >= deadline:
+                        self._stats['timedOut'] += 1
+                        raise AdmissionRejected(self._retry_after(tokens, now), len(self._waiting), 'timeout')
+                await asyncio.sleep(min(delay, self.poll_interval, max(0.0, deadline - now)))
+        except BaseException:
+            with self._lock:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+            raise
+
+    def settle(self, estimated_tokens: float, actual_tokens: float) -> None:
+        # 実際の使用トークン数が分かったら見積もりとの差を精算する
+        with self._lock:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def pause(self, seconds: float) -> None:
+        # クォータエラーを受けた場合、しばらく送信を止める
+        with self._lock:
+            now = time.monotonic()
+            self._stats['quotaErrors'] += 1
+            self.requests.pause(seconds, now)
+            self.tokens.pause(seconds, now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queueLength'] = len(self._waiting)
+        return stats
+
+    def _wait_time(self, tokens: float, now: float) -> float:
+        return max(self.requests.time_until(1, now), self.tokens.time_until(tokens, now))
+
+    def _admit(self, tokens: float) -> None:
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        self._stats['admitted'] += 1
+
+    def _retry_after(self, tokens: float, now: float) -> float:
+        # 待っている全員が通るまでの目安
+        backlog = len(self._waiting) + 1
+        return math.ceil(max(backlog / self.requests.rate, self._wait_time(tokens, now)))
+
+
+_gemini_admission = None
+_gemini_admission_lock = threading.Lock()
+
+
+def get_gemini_admission() -> AdmissionController:
+    """
+    プロセス全体で共有するGemini呼び出しの受付制御を返す関数。
+    GEMINI_RPM / GEMINI_TPM にクォータ、GEMINI_QUEUE_SIZE / GEMINI_QUEUE_TIMEOUT に待ち行列の上限を指定する。
+    """
+    global _gemini_admission
+    if _gemini_admission is None:
+        with _gemini_admission_lock:
+            if _gemini_admission is None:
+                _gemini_admission = AdmissionController(
+                    rpm=float(os.environ.get('GEMINI_RPM', '1000')),
+                    tpm=float(os.environ.get('GEMINI_TPM', '1000000')),
+                    max_queue=int(os.environ.get('GEMINI_QUEUE_SIZE', '50')),
+                    max_wait=float(os.environ.get('GEMINI_QUEUE_TIMEOUT', '20')),
+                    headroom=float(os.environ.get('GEMINI_QUOTA_HEADROOM', '0.9')),
+                )
+    return _gemini_admission
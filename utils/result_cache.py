@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def make_cache_key(image_bytes: bytes) -> str:
+    """
+    正規化済みJPEGのバイト列から魚種識別結果のキャッシュキーを作る関数。
+    漁業権と持ち帰りの判定は地点と漁業権データの更新で変わるのでキャッシュせず、毎回判定し直す。
+    """
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class ResultCache:
+    """
+    魚種識別結果のキャッシュ（画像ごと、位置に依存しない）。
+    プロセス内のLRU層とSQLiteのディスク層の2段構成で、どちらもTTLと件数上限を持つ。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_memory_entries: int = 256,
+                 max_disk_entries: int = 5000, ttl_seconds: float = 7 * 24 * 3600):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = OrderedDict()  # key -> (保存時刻, 結果)
+        self._lock = threading.Lock()
+        self._stats = {
+            'memoryHits': 0,
+            'diskHits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+        }
+
+        self._db = None
+        if db_path:
+            try:
+                db_dir = os.path.dirname(db_path)
+                if db_dir:
+                    os.makedirs(db_dir, exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed_at)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                # ディスク層が使えなくてもメモリ層だけで動作させる
+                print(f"⚠️ 結果キャッシュDBを開けません: {e}")
+                self._db = None
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._stats['memoryHits'] += 1
+                    return dict(value)
+                del self._memory[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT value, created_at FROM results WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        value_json, created_at = row
+                        if now - created_at <= self.ttl_seconds:
+                            self._db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+                            self._db.commit()
+                            value = json.loads(value_json)
+                            self._put_memory(key, created_at, value)
+                            self._stats['diskHits'] += 1
+                            return dict(value)
+                        self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                        self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ 結果キャッシュ読み込みエラー: {e}")
+
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, key: str, value: Dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, now, dict(value))
+            self._stats['stores'] += 1
+
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO results (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                        (key, json.dumps(value, ensure_ascii=False), now, now)
+                    )
+                    self._evict_disk(now)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ 結果キャッシュ書き込みエラー: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memoryEntries'] = len(self._memory)
+        hits = stats['memoryHits'] + stats['diskHits']
+        total = hits + stats['misses']
+        stats['hitRate'] = hits / total if total else 0.0
+        return stats
+
+    def _put_memory(self, key: str, created_at: float, value: Dict) -> None:
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _evict_disk(self, now: float) -> None:
+        # 期限切れを削除してから、上限を超えた分を最終アクセスが古い順に削除
+        cur = self._db.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._stats['evictions'] += max(cur.rowcount, 0)
+        count = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,)
+            )
+            self._stats['evictions'] += overflow
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """
+    プロセス全体で共有する魚種識別結果のキャッシュを返す関数。
+    RESULT_CACHE_PATHを空にするとディスク層を無効化できる。
+    """
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache(
+                    db_path=os.environ.get('RESULT_CACHE_PATH', 'cache/result_cache.sqlite3'),
+                    max_memory_entries=int(os.environ.get('RESULT_CACHE_MEMORY_ENTRIES', '256')),
+                    max_disk_entries=int(os.environ.get('RESULT_CACHE_DISK_ENTRIES', '5000')),
+                    ttl_seconds=float(os.environ.get('RESULT_CACHE_TTL', str(7 * 24 * 3600))),
+                )
+    return _result_cache
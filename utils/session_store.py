@@ -0,0 +1,107 @@
+"""
+セッションごとの画像をプロセス全体のメモリ予算内で保持する仕組み。
+st.session_state にはアップロードされたファイルそのものを置かず、前処理済みの画像をここに預けてキーだけを持つ。
+予算を超えたら、最後に使われてから時間が経ったセッションの画像から削除する（LRU）。
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# 画面表示に使う判定結果の項目（これ以外の項目はセッションに残さない）
+RESULT_FIELDS = (
+    'success', 'isLegal', 'message', 'fishNameJa', 'fishNameEn', 'scientificName', 'isPoisonous',
+    'gyogyoken', 'fisheryRightsStale', 'fisheryRightsAvailable', 'fisheryRightsFetchedAt',
+)
+
+
+def compact_result(result: Dict) -> Dict:
+    # セッションに保存する判定結果を表示に使う項目だけにする
+    return {key: result[key] for key in RESULT_FIELDS if key in result}
+
+
+class SessionImageStore:
+    """
+    前処理済みの画像（送信用・プレビュー用）をセッションのキーごとに保持するLRUストア。
+    合計のバイト数が budget_bytes を超えないように、使われていない画像から削除する。
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()  # キー -> {'imageHash', 'imageBytes', 'previewBytes', 'size', 'storedAt'}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'stores': 0,
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+        }
+
+    def put(self, image_bytes: bytes, preview_bytes: bytes) -> str:
+        """画像を保存してセッションに持たせるキーを返す"""
+        key = uuid.uuid4().hex
+        entry = {
+            'imageHash': hashlib.sha256(image_bytes).hexdigest(),
+            'imageBytes': image_bytes,
+            'previewBytes': preview_bytes,
+            'size': len(image_bytes) + len(preview_bytes),
+            'storedAt': time.time(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._bytes += entry['size']
+            self._stats['stores'] += 1
+            # 今保存した画像以外を、古い順に予算内に収まるまで削除する
+            while self._bytes > self.budget_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted['size']
+                self._stats['evictions'] += 1
+        return key
+
+    def get(self, key: Optional[str]) -> Optional[Dict]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry
+
+    def discard(self, key: Optional[str]) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry['size']
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            stats['budgetBytes'] = self.budget_bytes
+        return stats
+
+
+_session_image_store = None
+_session_image_store_lock = threading.Lock()
+
+
+def get_session_image_store() -> SessionImageStore:
+    """
+    プロセス全体で共有するセッション画像のストアを返す関数。
+    SESSION_IMAGE_BUDGET_MB: 全セッションの画像に使うメモリの上限（MB）
+    """
+    global _session_image_store
+    if _session_image_store is None:
+        with _session_image_store_lock:
+            if _session_image_store is None:
+                budget_mb = float(os.environ.get('SESSION_IMAGE_BUDGET_MB', '128'))
+                _session_image_store = SessionImageStore(int(budget_mb * 1024 * 1024))
+    return _session_image_store
@@ -0,0 +1,120 @@
+"""
+同じキーの処理が実行中なら、新しく実行せずにその結果を待つ（single-flight）仕組み。
+同じ画像の識別や同じタイルの漁業権検索が同時に来ても、外部APIへの問い合わせは1回にまとめる。
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    キーごとに実行中の処理を1つだけにするクラス。
+    結果は concurrent.futures.Future で共有するので、別のスレッドやイベントループからも待てる。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}  # キー -> concurrent.futures.Future
+        self._running = {}  # キー -> (イベントループ, 実行中のタスク)
+        self._waiters = {}  # キー -> 結果を待っている呼び出し元の数
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'coalesced': 0,
+        }
+
+    def _join(self, key: Hashable):
+        # (Future, 自分が実行する側か) を返す
+        with self._lock:
+            self._stats['calls'] += 1
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats['coalesced'] += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._calls[key] = future
+            return future, True
+
+    def _leave(self, key: Hashable) -> bool:
+        # 待っている呼び出し元を1つ減らし、誰も待っていなくなったらTrueを返す
+        with self._lock:
+            count = self._waiters.get(key, 0) - 1
+            if count > 0:
+                self._waiters[key] = count
+                return False
+            self._waiters.pop(key, None)
+            return True
+
+    def _finish(self, key: Hashable) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+            self._running.pop(key, None)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        keyの処理が実行中ならその結果を、無ければfnを実行して結果を返す。
+        fnは呼び出し元とは独立したタスクで実行するので、最初の呼び出し元がキャンセルされても
+        待っている他の呼び出し元には結果が届く。待っている呼び出し元が全員キャンセルされた場合は処理も止める。
+        """
+        future, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(self._run(key, fn, future))
+            with self._lock:
+                self._running[key] = (asyncio.get_running_loop(), task)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        cancelled = False
+        try:
+            return await asyncio.shield(asyncio.wrap_future(future))
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if self._leave(key) and cancelled:
+                with self._lock:
+                    running = self._running.get(key)
+                if running is not None:
+                    loop, task = running
+                    loop.call_soon_threadsafe(task.cancel)
+
+    def do_sync(self, key: Hashable, fn: Callable[[], T]) -> T:
+        # do の同期版（最初の呼び出し元のスレッドでfnを実行する）
+        future, leader = self._join(key)
+        try:
+            if not leader:
+                return future.result()
+            try:
+                result = fn()
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            future.set_result(result)
+            return result
+        finally:
+            self._leave(key)
+            if leader:
+                self._finish(key)
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[T]], future: concurrent.futures.Future) -> None:
+        try:
+            result = await fn()
+        except BaseException as e:
+            future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            future.set_result(result)
+        finally:
+            self._finish(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['inFlight'] = len(self._calls)
+        return stats
@@ -0,0 +1,203 @@
+"""
+保護魚種リスト（第一種共同漁業権の対象種）と識別した魚種をローカルで照合するモジュール。
+表記ゆれの正規化、分類（上位カテゴリ・属）の対応表、事前に構築した索引で
+「タイ」→「マダイ」、「フグ」→「クサフグ」のような一致を決定的に判定する。
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+# 漢字表記 → ひらがな（長い表記から先に置き換える）
+KANJI_READINGS = {
+    '伊勢海老': 'いせえび', '伊勢蝦': 'いせえび', '車海老': 'くるまえび', '帆立貝': 'ほたてがい', '帆立': 'ほたて',
+    '栄螺': 'さざえ', '海胆': 'うに', '雲丹': 'うに', '海栗': 'うに', '海鼠': 'なまこ', '海鞘': 'ほや',
+    '海老': 'えび', '海苔': 'のり', '若布': 'わかめ', '和布': 'わかめ', '昆布': 'こんぶ', '鹿尾菜': 'ひじき',
+    '羊栖菜': 'ひじき', '天草': 'てんぐさ', '石花菜': 'てんぐさ', '海蘊': 'もずく', '水雲': 'もずく',
+    '布海苔': 'ふのり', '荒布': 'あらめ', '搗布': 'かじめ', '牡蠣': 'かき', '浅蜊': 'あさり', '河豚': 'ふぐ',
+    '蛤': 'はまぐり', '鮑': 'あわび', '鰒': 'あわび', '蝦': 'えび', '蟹': 'かに', '蛸': 'たこ', '章魚': 'たこ',
+    '烏賊': 'いか', '鯛': 'たい', '鮪': 'まぐろ', '貝': 'かい', '海藻': 'かいそう', '藻': 'も',
+}
+
+# 分類の表記（「あわび類」「うに等」「たこの仲間」など）の末尾
+CATEGORY_SUFFIXES = ('のなかま', 'のるい', 'るい', '類', '等', 'など', '属', '科')
+
+# 上位カテゴリ → (代表的な種名, 学名の属・科)
+TAXONOMY = {
+    'あわび': (('くろあわび', 'めがいあわび', 'まだかあわび', 'えぞあわび', 'とこぶし', 'ながれこ'),
+             ('haliotis', 'haliotidae')),
+    'とこぶし': (('ながれこ',), ('haliotis diversicolor',)),
+    'さざえ': ((), ('turbo sazae', 'turbo cornutus')),
+    'うに': (('むらさきうに', 'あかうに', 'ばふんうに', 'きたむらさきうに', 'えぞばふんうに', 'しらひげうに', 'がんがぜ'),
+           ('heliocidaris', 'anthocidaris', 'hemicentrotus', 'strongylocentrotus', 'mesocentrotus',
+            'pseudocentrotus', 'tripneustes', 'diadema', 'echinoidea')),
+    'なまこ': (('まなまこ', 'あかなまこ', 'あおなまこ', 'くろなまこ', 'きんこ'),
+             ('apostichopus', 'stichopus', 'holothuria', 'cucumaria', 'holothuroidea')),
+    'ほや': (('まぼや', 'あかぼや'), ('halocynthia',)),
+    'いせえび': (('かのこいせえび', 'しまいせえび'), ('panulirus',)),
+    'えび': (('いせえび', 'くるまえび', 'ぼたんえび', 'あまえび', 'ほっこくあかえび', 'しばえび', 'さくらえび'),
+           ('panulirus', 'penaeus', 'marsupenaeus', 'pandalus', 'metapenaeus', 'sergia')),
+    'かに': (('がざみ', 'ずわいがに', 'けがに', 'たらばがに', 'もくずがに', 'いしがに'),
+           ('portunus', 'charybdis', 'chionoecetes', 'erimacrus', 'paralithodes', 'eriocheir')),
+    'たこ': (('まだこ', 'いいだこ', 'みずだこ', 'てながだこ'),
+           ('octopus', 'amphioctopus', 'enteroctopus', 'callistoctopus', 'octopodidae')),
+    'かき': (('まがき', 'いわがき', 'すみのえがき'), ('crassostrea', 'magallana', 'ostreidae')),
+    'はまぐり': (('ちょうせんはまぐり',), ('meretrix',)),
+    'あさり': ((), ('ruditapes',)),
+    'ほたてがい': (('ほたて',), ('mizuhopecten', 'patinopecten')),
+    'とりがい': ((), ('fulvia',)),
+    'たいらぎ': ((), ('atrina',)),
+    'ばい': (('ばいがい',), ('babylonia',)),
+    'つぶ': (('つぶがい', 'えぞぼら', 'ひめえぞぼら'), ('neptunea', 'buccinum')),
+    'みるくい': (('みるがい',), ('tresus',)),
+    'かい': (('あわび', 'とこぶし', 'さざえ', 'かき', 'はまぐり', 'あさり', 'ほたてがい', 'とりがい', 'たいらぎ', 'ばい',
+             'つぶ', 'みるくい', 'あかがい', 'さるぼう', 'まてがい', 'いがい', 'むらさきいがい'),
+           ('bivalvia', 'gastropoda')),
+    'わかめ': ((), ('undaria',)),
+    'こんぶ': (('まこんぶ', 'りしりこんぶ', 'らうすこんぶ', 'ながこんぶ'), ('saccharina', 'laminaria')),
+    'ひじき': ((), ('sargassum fusiforme', 'hizikia')),
+    'てんぐさ': (('まくさ', 'おばくさ', 'おにくさ'), ('gelidium', 'pterocladiella')),
+    'もずく': (('おきなわもずく', 'いしもずく'), ('nemacystus', 'cladosiphon', 'sphaerotrichia')),
+    'のり': (('あまのり', 'すさびのり', 'あさくさのり', 'いわのり'), ('pyropia', 'porphyra', 'neopyropia')),
+    'ふのり': ((), ('gloiopeltis',)),
+    'あらめ': ((), ('eisenia',)),
+    'かじめ': ((), ('ecklonia',)),
+    'おごのり': ((), ('gracilaria',)),
+    'とさかのり': ((), ('meristotheca',)),
+    'あおさ': (('あおのり',), ('ulva',)),
+    'かいそう': (('わかめ', 'こんぶ', 'ひじき', 'てんぐさ', 'もずく', 'のり', 'ふのり', 'あらめ', 'かじめ', 'おごのり',
+               'とさかのり', 'あおさ'), ()),
+    'たい': (('まだい', 'ちだい', 'きだい', 'くろだい', 'へだい', 'きちぬ', 'ちぬ', 'れんこだい', 'はなだい'),
+           ('pagrus', 'evynnis', 'dentex', 'acanthopagrus', 'sparus', 'rhabdosargus', 'sparidae')),
+    'まぐろ': (('くろまぐろ', 'ほんまぐろ', 'きはだ', 'めばち', 'びんなが', 'みなみまぐろ'), ('thunnus',)),
+    'ふぐ': (('とらふぐ', 'くさふぐ', 'こもんふぐ', 'まふぐ', 'しょうさいふぐ', 'ひがんふぐ', 'しまふぐ', 'ごまふぐ', 'さばふぐ',
+            'はりせんぼん'),
+           ('takifugu', 'lagocephalus', 'tetraodontidae', 'diodontidae')),
+    'あゆ': ((), ('plecoglossus',)),
+    'うなぎ': ((), ('anguilla',)),
+}
+
+# 同じものを指す別名（正規化後の表記 → 代表表記）
+SYNONYMS = {
+    'ほたて': 'ほたてがい',
+    'ほんまぐろ': 'くろまぐろ',
+    'ちぬ': 'くろだい',
+    'ばいがい': 'ばい',
+    'みるがい': 'みるくい',
+    'あまのり': 'のり',
+}
+
+# 連濁（「たい」→「まだい」、「かい」→「ほたてがい」）を考慮した末尾一致用
+_VOICED = str.maketrans('かきくけこさしすせそたちつてとはひふへほ', 'がぎぐげござじずぜぞだぢづでどばびぶべぼ')
+
+_KANJI_PATTERN = re.compile('|'.join(sorted(map(re.escape, KANJI_READINGS), key=len, reverse=True)))
+_STRIP_PATTERN = re.compile(r'[\s・･\-_()（）「」『』]')
+
+
+def normalize_name(name: str) -> str:
+    """
+    魚種名を照合用に正規化する関数。
+    NFKC正規化、漢字表記の読み替え、カタカナ→ひらがな、空白・記号の除去を行う。
+    """
+    if not name:
+        return ''
+    text = unicodedata.normalize('NFKC', name).strip().lower()
+    text = _KANJI_PATTERN.sub(lambda m: KANJI_READINGS[m.group(0)], text)
+    text = ''.join(chr(ord(c) - 0x60) if 'ァ' <= c <= 'ヶ' else c for c in text)
+    return _STRIP_PATTERN.sub('', text)
+
+
+@lru_cache(maxsize=4096)
+def category_key(protected_name: str) -> str:
+    # 保護魚種の表記から分類表記の末尾を除いてキーにする（「あわび類」→「あわび」）
+    key = normalize_name(protected_name)
+    for suffix in CATEGORY_SUFFIXES:
+        if key.endswith(suffix) and len(key) > len(suffix):
+            key = key[:-len(suffix)]
+            break
+    return SYNONYMS.get(key, key)
+
+
+def _compile_taxonomy() -> Tuple[Dict[str, FrozenSet[str]], Dict[str, FrozenSet[str]]]:
+    """
+    種名・学名 → 所属するカテゴリの集合 の索引を作る関数。
+    カテゴリの代表種がさらにカテゴリの場合（かい → あわび → くろあわび）もたどる。
+    """
+    name_index = {}
+    scientific_index = {}
+
+    def members(category: str, seen: frozenset) -> Iterable[Tuple[str, str]]:
+        names, scientific = TAXONOMY.get(category, ((), ()))
+        for s in scientific:
+            yield 'scientific', s
+        for name in names:
+            yield 'name', name
+            if name in TAXONOMY and name not in seen:
+                yield from members(name, seen | {name})
+
+    for category in TAXONOMY:
+        name_index.setdefault(category, set()).add(category)
+        for kind, value in members(category, frozenset({category})):
+            index = name_index if kind == 'name' else scientific_index
+            index.setdefault(value, set()).add(category)
+
+    return ({k: frozenset(v) for k, v in name_index.items()},
+            {k: frozenset(v) for k, v in scientific_index.items()})
+
+
+_NAME_INDEX, _SCIENTIFIC_INDEX = _compile_taxonomy()
+
+
+def _suffix_variants(key: str) -> Tuple[str, ...]:
+    return (key, key[0].translate(_VOICED) + key[1:])
+
+
+@lru_cache(maxsize=4096)
+def species_categories(fish_name_ja: str, fish_name_hira: str = '', scientific_name: str = '') -> FrozenSet[str]:
+    """
+    識別した魚種が属する照合キー（正規化した種名とカテゴリ）の集合を返す関数。
+    """
+    keys = set()
+    for name in (fish_name_ja, fish_name_hira):
+        normalized = SYNONYMS.get(normalize_name(name), normalize_name(name))
+        if not normalized:
+            continue
+        keys.add(normalized)
+        keys |= _NAME_INDEX.get(normalized, frozenset())
+
+    scientific = ' '.join(unicodedata.normalize('NFKC', scientific_name or '').lower().split())
+    if scientific:
+        # 「属 種」と「属」のどちらでも引けるように、前方の語から順に照合する
+        words = scientific.split(' ')
+        for i in range(len(words), 0, -1):
+            keys |= _SCIENTIFIC_INDEX.get(' '.join(words[:i]), frozenset())
+    return frozenset(keys)
+
+
+@lru_cache(maxsize=4096)
+def _matches(keys: FrozenSet[str], protected_key: str) -> bool:
+    if not protected_key:
+        return False
+    if protected_key in keys:
+        return True
+    # 「くろあわび」と「あわび」、「まだい」と「たい」のような末尾一致（2文字以上のキーのみ）
+    if len(protected_key) >= 2:
+        variants = _suffix_variants(protected_key)
+        return any(key.endswith(variant) for key in keys for variant in variants)
+    return False
+
+
+def match_protected_species(species: Dict, protected_species: List[str]) -> List[str]:
+    """
+    識別結果（fishNameJa / fishNameHira / scientificName）に一致する保護魚種をリストで返す関数。
+    """
+    keys = species_categories(
+        species.get('fishNameJa') or '',
+        species.get('fishNameHira') or '',
+        species.get('scientificName') or '',
+    )
+    return [p for p in protected_species if _matches(keys, category_key(p))]
+
+
+def is_restricted(species: Dict, protected_species: List[str]) -> bool:
+    return bool(match_protected_species(species, protected_species))
@@ -0,0 +1,61 @@
+"""
+画面で使う画像・動画をStreamlitの静的ファイル配信（./static → app/static/）に置く仕組み。
+ファイル名に内容のハッシュを付けるので、内容が変わればURLも変わり、ブラウザのキャッシュをそのまま使える。
+ページにはbase64の埋め込みではなくURLだけを書くので、再実行のたびに画像のデータを送らずに済む。
+"""
+import base64
+import hashlib
+import mimetypes
+import os
+import shutil
+from typing import Dict
+
+# Streamlitの静的ファイル配信のURL（.streamlit/config.toml の server.enableStaticServing = true が必要）
+STATIC_URL_PREFIX = 'app/static'
+HASH_LENGTH = 12
+
+
+def _content_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+
+
+def _data_uri(path: str) -> str:
+    mime_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    with open(path, 'rb') as f:
+        return f"data:{mime_type};base64,{base64.b64encode(f.read()).decode('utf-8')}"
+
+
+def publish_asset(source: str, static_dir: str) -> str:
+    """
+    sourceをハッシュ付きのファイル名でstatic_dirにコピーして、ページから参照するURLを返す関数。
+    同じ名前の古いハッシュのファイルは削除する。コピーできない場合はbase64のdata URIを返す。
+    """
+    stem, ext = os.path.splitext(os.path.basename(source))
+    try:
+        name = f"{stem}.{_content_hash(source)}{ext}"
+        target = os.path.join(static_dir, name)
+        if not os.path.exists(target):
+            os.makedirs(static_dir, exist_ok=True)
+            # 書きかけのファイルが配信されないように、一時ファイルに書いてから置き換える
+            temporary = f"{target}.tmp{os.getpid()}"
+            shutil.copyfile(source, temporary)
+            os.replace(temporary, target)
+        for existing in os.listdir(static_dir):
+            old_stem, old_ext = os.path.splitext(existing)
+            if existing != name and old_ext == ext and old_stem.rsplit('.', 1)[0] == stem:
+                os.remove(os.path.join(static_dir, existing))
+    except OSError as e:
+        print(f"⚠️ 静的ファイルを配置できません（base64で埋め込みます）: {source}: {e}")
+        return _data_uri(source)
+    return f"{STATIC_URL_PREFIX}/{name}"
+
+
+def publish_assets(sources: Dict[str, str], static_dir: str) -> Dict[str, str]:
+    """
+    {名前: 元のファイルのパス} の各ファイルを配置して {名前: URL} を返す関数。
+    STATIC_ASSETS=0 の場合は配置せず、すべてbase64のdata URIで返す。
+    """
+    if os.environ.get('STATIC_ASSETS', '1') == '0':
+        return {key: _data_uri(path) for key, path in sources.items()}
+    return {key: publish_asset(path, static_dir) for key, path in sources.items()}
@@ -0,0 +1,207 @@
+"""
+起動時のウォームアップと準備完了（readiness）の判定。
+最初のページ表示の後に、遅延importしたライブラリの読み込み・外部API（海しる・HeartRails・ArcGIS）への
+DNS解決と接続の確立・Geminiクライアントの準備を裏で済ませ、最初の識別が遅くならないようにする。
+準備が済むまでは is_ready() が False になり、READINESS_PORT を指定すると /ready でも確認できる。
+"""
+import asyncio
+import importlib
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from .aio import run_sync
+from .api_keys import load_api_keys
+from .http_client import ENDPOINTS, get_timeout, request, request_async
+
+# 起動時には読み込まず、ウォームアップで読み込むモジュール
+WARMUP_MODULES = (
+    'google.generativeai',
+    'google.api_core.exceptions',
+    'aiohttp',
+    'geopy.geocoders',
+    'utils.geocoder',
+    'pillow_heif',
+)
+
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+_status_lock = threading.Lock()
+_warmup_status = {
+    'started': None,
+    'finished': None,
+    'timings': {},  # 処理名 -> 秒
+    'errors': {},  # 処理名 -> エラーメッセージ
+    'dependencies': {},  # 依存先 -> {'ok', 'seconds'}
+}
+_readiness_server = None
+
+
+def warmup_urls() -> Dict[str, str]:
+    """
+    接続を確立しておく外部APIのURL（エンドポイント名 -> URL）。
+    WARMUP_URL_<名前>（例: WARMUP_URL_MSIL=http://127.0.0.1:8081/）でテスト用のスタブサーバーに向けられる。
+    """
+    return {name: os.environ.get(f'WARMUP_URL_{name.upper()}', config['prefix'])
+            for name, config in ENDPOINTS.items()}
+
+
+def _timed(name: str, fn) -> bool:
+    started = time.perf_counter()
+    ok = True
+    try:
+        fn()
+    except Exception as e:
+        ok = False
+        with _status_lock:
+            _warmup_status['errors'][name] = str(e)
+        print(f"ウォームアップエラー ({name}): {e}")
+    finally:
+        with _status_lock:
+            _warmup_status['timings'][name] = time.perf_counter() - started
+    return ok
+
+
+def _warm_endpoint(name: str, url: str) -> None:
+    # DNS解決 → 共有requestsセッション → 共有ループのaiohttpセッションの順に接続を確立しておく
+    # 応答のステータスは問わない（APIキー無しのHEADでも、接続とTLSハンドシェイクは済む）
+    # 証明書の検証などは本番の呼び出しと同じく http_client のエンドポイント設定に任せ、同じ接続プールを温める
+    started = time.perf_counter()
+    parsed = urlparse(url)
+    port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    connect, _ = get_timeout(name)
+    timeout = (connect, connect)
+    results = [
+        _timed(f'dns:{name}', lambda: socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)),
+        _timed(f'http:{name}', lambda: request(name, 'HEAD', url, timeout=timeout, allow_redirects=False)),
+        _timed(f'aiohttp:{name}', lambda: run_sync(request_async(name, 'HEAD', url, allow_redirects=False),
+                                                   timeout=connect * 4)),
+    ]
+    _record_dependency(name, all(results), time.perf_counter() - started)
+
+
+def _record_dependency(name: str, ok: bool, seconds: float) -> None:
+    with _status_lock:
+        _warmup_status['dependencies'][name] = {'ok': ok, 'seconds': seconds}
+    print(f"ウォームアップ {name}: {'OK' if ok else 'NG'} {seconds:.2f}s")
+
+
+def _default_gemini_probe() -> Awaitable[None]:
+    from .gemini_api import probe_gemini
+    return probe_gemini()
+
+
+def run_warmup(urls: Dict[str, str] = None,
+               gemini_probe: Optional[Callable[[], Awaitable[None]]] = _default_gemini_probe) -> Dict:
+    """
+    ウォームアップを実行して状態を返す関数（start_warmup から裏のスレッドで呼ばれる）。
+    urls: 接続を確立しておくURL（未指定なら warmup_urls()）
+    gemini_probe: Geminiの準備を行うコルーチンを返す関数（Noneまたは GEMINI_PROBE=0 で省略）
+    """
+    with _status_lock:
+        _warmup_status['started'] = time.time()
+        _warmup_status['finished'] = None
+        _warmup_status['timings'] = {}
+        _warmup_status['errors'] = {}
+        _warmup_status['dependencies'] = {}
+
+    _timed('apiKeys', load_api_keys)
+    for module in WARMUP_MODULES:
+        _timed(f'import:{module}', lambda module=module: importlib.import_module(module))
+
+    for name, url in (urls or warmup_urls()).items():
+        _warm_endpoint(name, url)
+
+    if gemini_probe is not None and os.environ.get('GEMINI_PROBE', '1') != '0':
+        timeout = float(os.environ.get('GEMINI_PROBE_TIMEOUT', '30'))
+        started = time.perf_counter()
+        ok = _timed('gemini', lambda: run_sync(asyncio.wait_for(gemini_probe(), timeout)))
+        _record_dependency('gemini', ok, time.perf_counter() - started)
+
+    with _status_lock:
+        _warmup_status['finished'] = time.time()
+        total = _warmup_status['finished'] - _warmup_status['started']
+    print(f"ウォームアップ完了: {total:.2f}s（準備完了: {is_ready()}）")
+    return get_warmup_status()
+
+
+def start_warmup() -> Optional[threading.Thread]:
+    """
+    ウォームアップを裏のスレッドで1回だけ始める関数（2回目以降は何もしない）。
+    WARMUP=0 の場合は実行せず、最初から準備完了として扱う。
+    READINESS_PORT を指定すると、準備完了を返すHTTPエンドポイントも起動する。
+    """
+    global _warmup_thread
+    port = os.environ.get('READINESS_PORT')
+    if port:
+        start_readiness_server(int(port))
+    if os.environ.get('WARMUP', '1') == '0':
+        return None
+    if _warmup_thread is not None:
+        return _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=run_warmup, name='warmup', daemon=True)
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def is_ready() -> bool:
+    """
+    ウォームアップが終わっていればTrueを返す関数。
+    WARMUP_REQUIRED（例: gemini,msil）に指定した依存先は、接続に成功していることも条件にする。
+    """
+    if os.environ.get('WARMUP', '1') == '0':
+        return True
+    required = [name.strip() for name in os.environ.get('WARMUP_REQUIRED', '').split(',') if name.strip()]
+    with _status_lock:
+        if _warmup_status['finished'] is None:
+            return False
+        dependencies = _warmup_status['dependencies']
+        return all(dependencies.get(name, {}).get('ok') for name in required)
+
+
+def get_warmup_status() -> Dict:
+    with _status_lock:
+        status = dict(_warmup_status)
+        status['timings'] = dict(_warmup_status['timings'])
+        status['errors'] = dict(_warmup_status['errors'])
+        status['dependencies'] = {name: dict(value) for name, value in _warmup_status['dependencies'].items()}
+    status['done'] = status['finished'] is not None
+    status['ready'] = is_ready()
+    return status
+
+
+class _ReadinessHandler(BaseHTTPRequestHandler):
+    # GET /ready: 準備完了なら200、まだなら503（本文はウォームアップの状態のJSON）
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('/ready', '/warmup'):
+            self.send_error(404)
+            return
+        status = get_warmup_status()
+        code = 200 if status['ready'] or self.path.rstrip('/') == '/warmup' else 503
+        body = json.dumps(status, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_readiness_server(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    # 準備完了を返すHTTPサーバーを裏のスレッドで起動する（プロセスで1つ、port=0なら空いているポート）
+    global _readiness_server
+    with _warmup_lock:
+        if _readiness_server is None:
+            _readiness_server = ThreadingHTTPServer((host, port), _ReadinessHandler)
+            threading.Thread(target=_readiness_server.serve_forever, name='readiness', daemon=True).start()
+            print(f"readinessエンドポイント: http://{host}:{_readiness_server.server_address[1]}/ready")
+    return _readiness_server